@@ -0,0 +1,22 @@
+"""Prebuild the crop table's column arrays for faster recommender startup.
+
+Usage: python build_crop_npz.py [path/to/crop_params_india.json]
+
+Writes <table>.npz next to the JSON. CropRecommender loads it instead of
+rebuilding the arrays, as long as it is newer than the JSON and lists the
+same crops; rerun this script after editing the table.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+from crop_recomendation import CropRecommender, npz_path_for
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(__file__), 'data', 'crop_params_india.json')
+
+if __name__ == '__main__':
+    table_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE
+    recommender = CropRecommender(crop_table_path=table_path)
+    npz_path = npz_path_for(table_path)
+    recommender.save_arrays(npz_path)
+    print(f"✅ Wrote {len(recommender.crop_table)} crops to {npz_path}")
@@ -12,18 +12,39 @@ Author: CropEye1 System
 Date: October 19, 2025
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request
 from flask_cors import CORS
+import hashlib
 import logging
 import os
+import shutil
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv("file.env")
+# Optional: orjson encodes responses several times faster than stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: msgspec parses and validates request bodies in compiled code
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Optional: cachetools provides the TTL cache for integrated responses
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
 
-# Import crop recommendation module
+# Import crop recommendation module (this also loads file.env, before any
+# of the os.getenv() settings below are read)
 try:
     from crop_recomendation import CropRecommender
 except ImportError:
@@ -32,7 +53,7 @@ except ImportError:
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv('CROP_LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -41,6 +62,25 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+
+def dumps_json(obj):
+    """Encode obj to JSON bytes (orjson when installed, Flask's encoder otherwise)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return app.json.dumps(obj).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    """Response equivalent of `jsonify(obj), status`, encoded by dumps_json"""
+    return Response(dumps_json(obj), status=status, mimetype='application/json')
+
+
+@app.before_request
+def _stamp_request():
+    """Format the response timestamp once per request"""
+    g.ts = datetime.now().isoformat()
+
+
 # Initialize recommender with crop database (use path relative to this file)
 CROP_DIR = os.path.dirname(__file__)
 CROP_DATA_PATH = os.path.join(CROP_DIR, 'data', 'crop_params_india.json')
@@ -62,6 +102,91 @@ SOIL_API_URL = os.getenv('SOIL_API_URL', 'http://127.0.0.1:5002')
 WEATHER_API_URL = os.getenv('WEATHER_API_URL', 'http://127.0.0.1:5003')
 NDVI_API_URL = os.getenv('NDVI_API_URL', 'http://127.0.0.1:5001')
 
+# Downstream calls for the integrated endpoint run concurrently on this pool, sized
+# so every gunicorn request thread (CROP_THREADS, see gunicorn_conf.py) can have its
+# three fetches in flight at once instead of queueing behind other requests
+FETCH_TIMEOUT = 10
+FETCH_POOL = ThreadPoolExecutor(max_workers=3 * int(os.getenv('CROP_THREADS', 8)))
+
+# Keep-alive connection pool shared by all downstream calls. Only connection failures
+# are retried: a retried read timeout would keep a fetch thread busy for several
+# FETCH_TIMEOUTs after the handler has stopped waiting for it
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                       max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.1))
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+
+# Assembled integrated responses per ~1 km cell (without the timestamp or the
+# NDVI raster, see without_ndvi_raster); the 5 minute TTL lets weather updates flow through
+INTEGRATED_CACHE_TTL = 300
+_integrated_cache = TTLCache(maxsize=1024, ttl=INTEGRATED_CACHE_TTL) if TTLCache else None
+_integrated_cache_lock = threading.Lock()
+
+
+def fetch_soil_data(lat, lng):
+    """Fetch soil analysis from the Soil API; returns parsed JSON or None"""
+    try:
+        soil_response = SESSION.post(
+            f"{SOIL_API_URL}/api/soil/analyze",
+            json={'latitude': lat, 'longitude': lng},
+            timeout=FETCH_TIMEOUT
+        )
+        if soil_response.status_code == 200:
+            soil_data = soil_response.json()
+            logger.debug("✅ Soil data retrieved")
+            return soil_data
+    except Exception as e:
+        logger.warning(f"⚠️ Could not fetch soil data: {e}")
+    return None
+
+
+def fetch_weather_data(lat, lng):
+    """Fetch current weather from the Weather API; returns parsed JSON or None"""
+    try:
+        # Weather endpoint is GET with query params
+        weather_response = SESSION.get(
+            f"{WEATHER_API_URL}/api/weather/current",
+            params={'lat': lat, 'lng': lng},
+            timeout=FETCH_TIMEOUT
+        )
+        if weather_response.status_code == 200:
+            weather_data = weather_response.json()
+            logger.debug("✅ Weather data retrieved")
+            return weather_data
+    except requests.RequestException as e:
+        logger.warning(f"⚠️ Could not fetch weather data: {e}")
+    return None
+
+
+def fetch_ndvi_data(lat, lng):
+    """Fetch NDVI analysis from the NDVI API; returns parsed JSON or None"""
+    try:
+        ndvi_response = SESSION.post(
+            f"{NDVI_API_URL}/api/ndvi/analyze",
+            json={'latitude': lat, 'longitude': lng, 'use_real_data': True},
+            timeout=FETCH_TIMEOUT
+        )
+        if ndvi_response.status_code == 200:
+            ndvi_data = ndvi_response.json()
+            logger.debug("✅ NDVI data retrieved")
+            return ndvi_data
+    except requests.RequestException as e:
+        logger.warning(f"⚠️ Could not fetch NDVI data: {e}")
+    return None
+
+
+def without_ndvi_raster(ndvi_data):
+    """ndvi_data without the synthetic NDVI raster (megabytes of floats per response)
+
+    Cached integrated results keep only the NDVI summary; the raster itself is
+    served by the NDVI API's /api/ndvi/analyze.
+    """
+    inner = ndvi_data.get('data') if isinstance(ndvi_data, dict) else None
+    if not isinstance(inner, dict) or 'ndvi_array' not in inner:
+        return ndvi_data
+    return dict(ndvi_data, data={k: v for k, v in inner.items() if k != 'ndvi_array'})
+
 
 # ============================================================================
 # HEALTH CHECK
@@ -70,19 +195,86 @@ NDVI_API_URL = os.getenv('NDVI_API_URL', 'http://127.0.0.1:5001')
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'service': 'Crop Recommendation API',
         'version': '1.0.0',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': g.ts,
         'recommender_loaded': recommender is not None
-    }), 200
+    }, 200)
 
 
 # ============================================================================
 # CROP RECOMMENDATION ENDPOINTS
 # ============================================================================
 
+if msgspec is not None:
+    class RecommendIn(msgspec.Struct):
+        """Request body of /api/crop/recommend"""
+        latitude: float
+        longitude: float
+        ph: float
+        rainfall: float
+        temp_mean: float
+        ndvi: float = 0.5
+
+    # strict=False keeps float() semantics for numeric strings such as "7.1"
+    _recommend_decoder = msgspec.json.Decoder(RecommendIn, strict=False)
+
+
+def decode_recommend_input(body):
+    """Parse and validate a recommend body in one pass (None: use the manual checks)"""
+    if msgspec is None:
+        return None
+    try:
+        return msgspec.structs.asdict(_recommend_decoder.decode(body))
+    except msgspec.MsgspecError:
+        return None
+
+
+def build_recommendation_response(input_params):
+    """Rank crops for validated input_params and build the /api/crop/recommend payload"""
+    # Get recommendations (only the top 10 are returned, so only build those)
+    recommendations = recommender.recommend(input_params, top_k=10)
+
+    # Add crop requirements to each recommendation
+    for rec in recommendations:
+        crop_name = rec['crop']
+        if crop_name in recommender.crop_table:
+            crop_params = recommender.crop_table[crop_name]
+
+            rec['rainfall_requirements'] = {
+                'min_mm': crop_params.get('rain_min_mm', 0),
+                'max_mm': crop_params.get('rain_max_mm', 0),
+                'optimal_range': f"{crop_params.get('rain_min_mm', 0)}-{crop_params.get('rain_max_mm', 0)} mm/year"
+            }
+
+            rec['ph_requirements'] = {
+                'min': crop_params.get('ph_min', 0),
+                'max': crop_params.get('ph_max', 0),
+                'optimal_range': f"{crop_params.get('ph_min', 0)} - {crop_params.get('ph_max', 0)}"
+            }
+
+            rec['temp_requirements'] = {
+                'min_c': crop_params.get('tmin', 0),
+                'max_c': crop_params.get('tmax', 0),
+                'optimal_range': f"{crop_params.get('tmin', 0)} - {crop_params.get('tmax', 0)} °C"
+            }
+
+    # Format response
+    return {
+        'success': True,
+        'timestamp': g.ts,
+        'location': {
+            'latitude': input_params['latitude'],
+            'longitude': input_params['longitude']
+        },
+        'input_parameters': input_params,
+        'recommendations': recommendations,  # Top 10 crops
+        'total_crops_analyzed': len(recommender.crop_table)
+    }
+
+
 @app.route('/api/crop/recommend', methods=['POST'])
 def recommend_crops():
     """
@@ -101,97 +293,156 @@ def recommend_crops():
     Returns ranked crop recommendations
     """
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['latitude', 'longitude', 'ph', 'rainfall', 'temp_mean']
-        missing_fields = [f for f in required_fields if f not in data]
-        
-        if missing_fields:
-            return jsonify({
-                'success': False,
-                'error': f'Missing required fields: {", ".join(missing_fields)}',
-                'timestamp': datetime.now().isoformat()
-            }), 400
-        
+        # Fast path: well-formed bodies are decoded and validated by msgspec.
+        # Anything it rejects goes through the manual checks below so error
+        # responses stay the same.
+        input_params = decode_recommend_input(request.get_data())
+
+        if input_params is None:
+            data = request.get_json()
+
+            # Validate required fields
+            required_fields = ['latitude', 'longitude', 'ph', 'rainfall', 'temp_mean']
+            missing_fields = [f for f in required_fields if f not in data]
+
+            if missing_fields:
+                return json_response({
+                    'success': False,
+                    'error': f'Missing required fields: {", ".join(missing_fields)}',
+                    'timestamp': g.ts
+                }, 400)
+
         if not recommender:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': 'Crop recommender not initialized. Check crop database.',
-                'timestamp': datetime.now().isoformat()
-            }), 503
-        
-        # Prepare input for recommender
-        input_params = {
-            'latitude': float(data['latitude']),
-            'longitude': float(data['longitude']),
-            'ph': float(data['ph']),
-            'rainfall': float(data['rainfall']),
-            'temp_mean': float(data['temp_mean']),
-            'ndvi': float(data.get('ndvi', 0.5))
-        }
+                'timestamp': g.ts
+            }, 503)
+
+        if input_params is None:
+            # Prepare input for recommender
+            input_params = {
+                'latitude': float(data['latitude']),
+                'longitude': float(data['longitude']),
+                'ph': float(data['ph']),
+                'rainfall': float(data['rainfall']),
+                'temp_mean': float(data['temp_mean']),
+                'ndvi': float(data.get('ndvi', 0.5))
+            }
         
-        logger.info(f"📊 Crop recommendation request: {input_params}")
+        # Per-request logs are DEBUG and lazily formatted; the dict repr is not free
+        logger.debug("📊 Crop recommendation request: %s", input_params)
         
-        # Get recommendations
-        recommendations = recommender.recommend(input_params)
-
-        # Add crop requirements to each recommendation
-        for rec in recommendations:
-            crop_name = rec['crop']
-            if crop_name in recommender.crop_table:
-                crop_params = recommender.crop_table[crop_name]
-
-                rec['rainfall_requirements'] = {
-                    'min_mm': crop_params.get('rain_min_mm', 0),
-                    'max_mm': crop_params.get('rain_max_mm', 0),
-                    'optimal_range': f"{crop_params.get('rain_min_mm', 0)}-{crop_params.get('rain_max_mm', 0)} mm/year"
-                }
-
-                rec['ph_requirements'] = {
-                    'min': crop_params.get('ph_min', 0),
-                    'max': crop_params.get('ph_max', 0),
-                    'optimal_range': f"{crop_params.get('ph_min', 0)} - {crop_params.get('ph_max', 0)}"
-                }
-
-                rec['temp_requirements'] = {
-                    'min_c': crop_params.get('tmin', 0),
-                    'max_c': crop_params.get('tmax', 0),
-                    'optimal_range': f"{crop_params.get('tmin', 0)} - {crop_params.get('tmax', 0)} °C"
-                }
-
-        # Format response
-        response = {
-            'success': True,
-            'timestamp': datetime.now().isoformat(),
-            'location': {
-                'latitude': input_params['latitude'],
-                'longitude': input_params['longitude']
-            },
-            'input_parameters': input_params,
-            'recommendations': recommendations[:10],  # Top 10 crops
-            'total_crops_analyzed': len(recommendations)
-        }
+        response = build_recommendation_response(input_params)
+        recommendations = response['recommendations']
         
-        logger.info(f"✅ Top recommendation: {recommendations[0]['crop']} (score: {recommendations[0]['score']})")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"✅ Top recommendation: {recommendations[0]['crop']} (score: {recommendations[0]['score']})")
         
-        return jsonify(response), 200
+        return json_response(response, 200)
         
     except ValueError as e:
         logger.error(f"❌ Invalid input: {e}")
-        return jsonify({
+        return json_response({
             'success': False,
             'error': f'Invalid input parameters: {str(e)}',
-            'timestamp': datetime.now().isoformat()
-        }), 400
+            'timestamp': g.ts
+        }, 400)
         
     except Exception as e:
         logger.error(f"❌ Error in crop recommendation: {e}")
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+            'timestamp': g.ts
+        }, 500)
+
+
+# Upper bound on cases per /api/crop/recommend/batch request
+MAX_BATCH_CASES = 100
+
+
+def _recommend_case(case):
+    """One batch entry: the /api/crop/recommend payload, or an error entry"""
+    if not isinstance(case, dict):
+        return {'success': False, 'error': 'Each case must be a JSON object'}
+
+    required_fields = ['latitude', 'longitude', 'ph', 'rainfall', 'temp_mean']
+    missing_fields = [f for f in required_fields if f not in case]
+    if missing_fields:
+        return {'success': False, 'error': f'Missing required fields: {", ".join(missing_fields)}'}
+
+    try:
+        input_params = {
+            'latitude': float(case['latitude']),
+            'longitude': float(case['longitude']),
+            'ph': float(case['ph']),
+            'rainfall': float(case['rainfall']),
+            'temp_mean': float(case['temp_mean']),
+            'ndvi': float(case.get('ndvi', 0.5))
+        }
+    except (TypeError, ValueError) as e:
+        return {'success': False, 'error': f'Invalid input parameters: {str(e)}'}
+
+    return build_recommendation_response(input_params)
+
+
+@app.route('/api/crop/recommend/batch', methods=['POST'])
+def recommend_crops_batch():
+    """
+    Recommend crops for several inputs in one request
+    
+    Request Body:
+    {
+        "cases": [
+            {"latitude": 30.8, "longitude": 75.8, "ph": 7.1, "rainfall": 900, "temp_mean": 30, "ndvi": 0.62},
+            ...
+        ]
+    }
+    
+    Returns {"results": [...]} in input order; each entry is the
+    /api/crop/recommend response for that case (or its own error)
+    """
+    try:
+        data = request.get_json()
+        cases = data.get('cases') if isinstance(data, dict) else None
+
+        if not isinstance(cases, list):
+            return json_response({
+                'success': False,
+                'error': 'Request body must contain a "cases" list',
+                'timestamp': g.ts
+            }, 400)
+
+        if len(cases) > MAX_BATCH_CASES:
+            return json_response({
+                'success': False,
+                'error': f'Too many cases (max {MAX_BATCH_CASES})',
+                'timestamp': g.ts
+            }, 400)
+
+        if not recommender:
+            return json_response({
+                'success': False,
+                'error': 'Crop recommender not initialized. Check crop database.',
+                'timestamp': g.ts
+            }, 503)
+
+        logger.debug("📊 Batch crop recommendation request: %d cases", len(cases))
+
+        return json_response({
+            'success': True,
+            'timestamp': g.ts,
+            'results': [_recommend_case(case) for case in cases]
+        }, 200)
+
+    except Exception as e:
+        logger.error(f"❌ Error in batch crop recommendation: {e}")
+        return json_response({
+            'success': False,
+            'error': str(e),
+            'timestamp': g.ts
+        }, 500)
 
 
 @app.route('/api/crop/recommend/integrated', methods=['POST'])
@@ -212,71 +463,58 @@ def recommend_crops_integrated():
         
         # Validate coordinates
         if 'latitude' not in data or 'longitude' not in data:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': 'Missing latitude or longitude',
-                'timestamp': datetime.now().isoformat()
-            }), 400
+                'timestamp': g.ts
+            }, 400)
         
         lat = float(data['latitude'])
         lng = float(data['longitude'])
         
-        logger.info(f"🌍 Integrated crop recommendation for ({lat}, {lng})")
+        logger.debug("🌍 Integrated crop recommendation for (%s, %s)", lat, lng)
+
+        # Serve repeat queries for the same cell from cache (?fresh=1 skips it)
+        cache_key = (round(lat, 2), round(lng, 2))
+        if _integrated_cache is not None and request.args.get('fresh') != '1':
+            with _integrated_cache_lock:
+                cached = _integrated_cache.get(cache_key)
+            if cached is not None:
+                return json_response(dict(
+                    cached,
+                    timestamp=g.ts,
+                    location={'latitude': lat, 'longitude': lng},
+                    input_parameters=dict(cached['input_parameters'], latitude=lat, longitude=lng)
+                ), 200)
         
         # Initialize result
         result = {
             'success': True,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': g.ts,
             'location': {'latitude': lat, 'longitude': lng},
             'data_sources': [],
             'recommendations': None
         }
         
-        # Fetch soil data
-        soil_data = None
-        try:
-            soil_response = requests.post(
-                f"{SOIL_API_URL}/api/soil/analyze",
-                json={'latitude': lat, 'longitude': lng},
-                timeout=10
-            )
-            if soil_response.status_code == 200:
-                soil_data = soil_response.json()
-                result['data_sources'].append('soil')
-                logger.info("✅ Soil data retrieved")
-        except Exception as e:
-            logger.warning(f"⚠️ Could not fetch soil data: {e}")
-        
-        # Fetch weather data
-        weather_data = None
-        try:
-            # Weather endpoint is GET with query params
-            weather_response = requests.get(
-                f"{WEATHER_API_URL}/api/weather/current",
-                params={'lat': lat, 'lng': lng},
-                timeout=10
-            )
-            if weather_response.status_code == 200:
-                weather_data = weather_response.json()
-                result['data_sources'].append('weather')
-                logger.info("✅ Weather data retrieved")
-        except requests.RequestException as e:
-            logger.warning(f"⚠️ Could not fetch weather data: {e}")
-        
-        # Fetch NDVI data
-        ndvi_data = None
-        try:
-            ndvi_response = requests.post(
-                f"{NDVI_API_URL}/api/ndvi/analyze",
-                json={'latitude': lat, 'longitude': lng, 'use_real_data': True},
-                timeout=10
-            )
-            if ndvi_response.status_code == 200:
-                ndvi_data = ndvi_response.json()
-                result['data_sources'].append('ndvi')
-                logger.info("✅ NDVI data retrieved")
-        except requests.RequestException as e:
-            logger.warning(f"⚠️ Could not fetch NDVI data: {e}")
+        # Fetch soil, weather and NDVI data concurrently
+        futures = {
+            'soil': FETCH_POOL.submit(fetch_soil_data, lat, lng),
+            'weather': FETCH_POOL.submit(fetch_weather_data, lat, lng),
+            'ndvi': FETCH_POOL.submit(fetch_ndvi_data, lat, lng),
+        }
+        fetched = {}
+        for source, future in futures.items():
+            try:
+                fetched[source] = future.result(timeout=FETCH_TIMEOUT + 1)
+            except FutureTimeoutError:
+                logger.warning(f"⚠️ Timed out waiting for {source} data")
+                future.cancel()
+                fetched[source] = None
+            if fetched[source] is not None:
+                result['data_sources'].append(source)
+        soil_data = fetched['soil']
+        weather_data = fetched['weather']
+        ndvi_data = fetched['ndvi']
         
         # Extract parameters for recommendation
         input_params = {
@@ -316,8 +554,8 @@ def recommend_crops_integrated():
         
         # Get recommendations
         if recommender:
-            recommendations = recommender.recommend(input_params)
-            result['recommendations'] = recommendations[:10]
+            recommendations = recommender.recommend(input_params, top_k=10)
+            result['recommendations'] = recommendations
             result['input_parameters'] = input_params
 
             # Attach crop requirement data for all integrated results
@@ -342,20 +580,48 @@ def recommend_crops_integrated():
                         'optimal_range': f"{params.get('tmin', 0)} - {params.get('tmax', 0)} °C"
                     }
 
-            logger.info(f"✅ Top crop: {recommendations[0]['crop']}")
+            logger.debug("✅ Top crop: %s", recommendations[0]['crop'])
+
+            # Only cache answers built from all three modules, so a module
+            # outage does not pin default inputs for the whole TTL
+            if _integrated_cache is not None and len(result['data_sources']) == len(futures):
+                cached = result
+                if 'ndvi_data' in result:
+                    cached = dict(result, ndvi_data=without_ndvi_raster(result['ndvi_data']))
+                with _integrated_cache_lock:
+                    _integrated_cache[cache_key] = cached
         else:
             result['success'] = False
             result['error'] = 'Recommender not available'
 
-        return jsonify(result), 200
+        return json_response(result, 200)
         
     except Exception as e:
         logger.error(f"❌ Error in integrated recommendation: {e}")
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+            'timestamp': g.ts
+        }, 500)
+
+
+# The crop table is static once loaded, so the list body is encoded once
+_crops_list_cache = None
+
+
+def _crops_list_payload():
+    """Return (json_bytes, etag) for /api/crop/list, built once per recommender"""
+    global _crops_list_cache
+    if _crops_list_cache is None or _crops_list_cache[0] is not recommender:
+        crops = recommender.list_crops()
+        body = dumps_json({
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            'total_crops': len(crops),
+            'crops': crops
+        })
+        _crops_list_cache = (recommender, body, hashlib.sha1(body).hexdigest())
+    return _crops_list_cache[1], _crops_list_cache[2]
 
 
 @app.route('/api/crop/list', methods=['GET'])
@@ -363,35 +629,26 @@ def list_crops():
     """List all available crops in the database"""
     try:
         if not recommender or not recommender.crop_table:
-            return jsonify({
+            return json_response({
                 'success': False,
                 'error': 'Crop database not loaded',
-                'timestamp': datetime.now().isoformat()
-            }), 503
+                'timestamp': g.ts
+            }, 503)
         
-        crops = []
-        for crop_name, params in recommender.crop_table.items():
-            crops.append({
-                'name': crop_name,
-                'ph_range': [params['ph_min'], params['ph_max']],
-                'rainfall_range_mm': [params['rain_min_mm'], params['rain_max_mm']],
-                'temp_range_c': [params['tmin'], params['tmax']]
-            })
-        
-        return jsonify({
-            'success': True,
-            'timestamp': datetime.now().isoformat(),
-            'total_crops': len(crops),
-            'crops': crops
-        }), 200
+        body, etag = _crops_list_payload()
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        # Answers 304 Not Modified when the client's If-None-Match matches
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"❌ Error listing crops: {e}")
-        return jsonify({
+        return json_response({
             'success': False,
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 500
+            'timestamp': g.ts
+        }, 500)
 
 
 # ============================================================================
@@ -400,21 +657,43 @@ def list_crops():
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({
+    return json_response({
         'success': False,
         'error': 'Endpoint not found',
-        'timestamp': datetime.now().isoformat()
-    }), 404
+        'timestamp': g.get('ts') or datetime.now().isoformat()
+    }, 404)
 
 
 @app.errorhandler(500)
 def internal_error(error):
     logger.error(f"Internal server error: {error}")
-    return jsonify({
+    return json_response({
         'success': False,
         'error': 'Internal server error',
-        'timestamp': datetime.now().isoformat()
-    }), 500
+        'timestamp': g.get('ts') or datetime.now().isoformat()
+    }, 500)
+
+
+# ============================================================================
+# WARM-UP
+# ============================================================================
+
+def warm_up():
+    """
+    Build lazily-initialized state at import time. Under gunicorn's
+    preload_app this runs once in the master, and the forked workers share
+    the compiled scoring kernel and the encoded crop list copy-on-write.
+    """
+    if not recommender or not recommender.crop_table:
+        return
+    try:
+        recommender.recommend({'ph': 6.5, 'rainfall': 700, 'temp_mean': 25, 'ndvi': 0.5}, top_k=10)
+        _crops_list_payload()
+    except Exception as e:
+        logger.warning(f"⚠️ Warm-up failed: {e}")
+
+
+warm_up()
 
 
 # ============================================================================
@@ -434,15 +713,30 @@ if __name__ == '__main__':
     logger.info("🌐 Endpoints:")
     logger.info("   • Health:      GET  /api/health")
     logger.info("   • Recommend:   POST /api/crop/recommend")
+    logger.info("   • Batch:       POST /api/crop/recommend/batch")
     logger.info("   • Integrated:  POST /api/crop/recommend/integrated")
     logger.info("   • List Crops:  GET  /api/crop/list")
     logger.info("")
     logger.info("=" * 80)
     logger.info("")
     
-    app.run(
-        host='0.0.0.0',
-        port=5004,
-        debug=True,
-        threaded=True
-    )
\ No newline at end of file
+    if os.getenv('FLASK_DEV'):
+        # Development: Werkzeug server with debugger and reloader
+        app.run(
+            host='0.0.0.0',
+            port=5004,
+            debug=True,
+            threaded=True
+        )
+    elif shutil.which('gunicorn'):
+        # Production: multi-process gunicorn, settings in gunicorn_conf.py
+        os.chdir(CROP_DIR or '.')
+        os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn_conf.py', 'crop_flask_backend:app'])
+    else:
+        logger.warning("⚠️ gunicorn not available; serving with the Flask server (debug off)")
+        app.run(
+            host='0.0.0.0',
+            port=5004,
+            debug=False,
+            threaded=True
+        )
\ No newline at end of file
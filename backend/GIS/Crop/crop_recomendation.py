@@ -8,11 +8,127 @@ Date: October 19, 2025
 
 import os
 import json
+from functools import lru_cache
+import numpy as np
 from dotenv import load_dotenv
 
-# Load from .env file automatically
+# Load from .env file automatically (once per process: crop_flask_backend
+# relies on this import rather than parsing file.env again)
 load_dotenv("file.env")
 
+# Weight overrides from the environment, read once at import
+_ENV_WEIGHTS = {
+    'ph': os.getenv('WEIGHT_PH'),
+    'rainfall': os.getenv('WEIGHT_RAIN'),
+    'temp': os.getenv('WEIGHT_TEMP'),
+    'ndvi': os.getenv('WEIGHT_NDVI')
+}
+
+# Optional: numba compiles the scoring loop; the NumPy path is used without it
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    njit = None
+    _NUMBA_AVAILABLE = False
+
+
+def _as_float(val):
+    """Coerce a table/input value to float, NaN when missing or non-numeric"""
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _quantize(val, ndigits):
+    """Round an input for use in the recommend() cache key (None when non-numeric)"""
+    v = _as_float(val)
+    return None if np.isnan(v) else round(v, ndigits)
+
+
+def _vec_score(v, mn, mx, ramp):
+    """Vectorized CropRecommender._scorer: v against per-crop [mn, mx] bands.
+
+    Returns 1.0 inside the band, a linear ramp over `ramp` (30% of the band
+    width) outside it, and 0.0 beyond that or wherever v or the bounds are NaN.
+    """
+    dist = np.where(v < mn, mn - v, v - mx)
+    # Zero-width bands have no ramp: anything outside scores 0
+    frac = np.divide(dist, ramp, out=np.full_like(dist, np.inf), where=ramp > 0)
+    score = np.where((v >= mn) & (v <= mx), 1.0, np.clip(1 - frac, 0.0, 1.0))
+    return np.nan_to_num(score, nan=0.0)
+
+
+def _score_all_numpy(v_ph, v_rain, v_temp, v_ndvi, bands, w):
+    """Overall score array and (n_crops, 3) ph/rain/temp component matrix"""
+    comps = np.empty((bands.shape[0], 3))
+    for j, v in enumerate((v_ph, v_rain, v_temp)):
+        comps[:, j] = _vec_score(v, bands[:, j, 0], bands[:, j, 1], bands[:, j, 2])
+    overall = comps[:, 0] * w[0] + comps[:, 1] * w[1] + comps[:, 2] * w[2] + v_ndvi * w[3]
+    return overall, comps
+
+
+def _score_all_loop(v_ph, v_rain, v_temp, v_ndvi, bands, w):
+    """Single pass over crops with the ramp formula inlined (compiled by numba)"""
+    n = bands.shape[0]
+    overall = np.empty(n)
+    comps = np.empty((n, 3))
+    vals = (v_ph, v_rain, v_temp)
+    for i in range(n):
+        for j in range(3):
+            v = vals[j]
+            mn = bands[i, j, 0]
+            mx = bands[i, j, 1]
+            ramp = bands[i, j, 2]
+            if mn <= v <= mx:
+                s = 1.0
+            elif v < mn and ramp > 0:
+                s = max(0.0, 1 - (mn - v) / ramp)
+            elif v > mx and ramp > 0:
+                s = max(0.0, 1 - (v - mx) / ramp)
+            else:
+                s = 0.0  # no ramp, or NaN value/bounds
+            comps[i, j] = s
+        overall[i] = comps[i, 0] * w[0] + comps[i, 1] * w[1] + comps[i, 2] * w[2] + v_ndvi * w[3]
+    return overall, comps
+
+
+_score_all = njit(cache=True)(_score_all_loop) if _NUMBA_AVAILABLE else _score_all_numpy
+
+
+def _round3(values):
+    """Round scores to 3 places with Python's round() (correctly rounded, unlike
+    np.round), so displayed scores stay monotonic with the ranking"""
+    return np.array([round(x, 3) for x in values.tolist()])
+
+
+def _top_k_order(scores, top_k):
+    """Indices of the top_k highest scores, best first; ties keep array order"""
+    # O(n) selection of the k best, then sort just those k
+    kth = -np.partition(-scores, top_k - 1)[top_k - 1]
+    above = np.flatnonzero(scores > kth)
+    tied = np.flatnonzero(scores == kth)[:top_k - above.shape[0]]
+    top_idx = np.concatenate((above, tied))
+    return top_idx[np.lexsort((top_idx, -scores[top_idx]))]
+
+
+# SoA attribute -> crop table key
+_COLUMNS = {
+    'ph_min': 'ph_min',
+    'ph_max': 'ph_max',
+    'rain_min': 'rain_min_mm',
+    'rain_max': 'rain_max_mm',
+    'tmin': 'tmin',
+    'tmax': 'tmax',
+}
+
+
+def npz_path_for(crop_table_path):
+    """Location of the prebuilt column file for a JSON crop table"""
+    return os.path.splitext(crop_table_path)[0] + '.npz'
+
+
 class CropRecommender:
     def __init__(self, crop_table_path='data/crop_params_india.json', weights=None):
         # Load static rule-based crop info (official/extension values)
@@ -20,12 +136,7 @@ class CropRecommender:
             self.crop_table = json.load(f)
         # Default weights (can be overridden by `weights` dict or env vars)
         # importance: ph, rainfall, temperature, ndvi
-        env_w = {
-            'ph': os.getenv('WEIGHT_PH'),
-            'rainfall': os.getenv('WEIGHT_RAIN'),
-            'temp': os.getenv('WEIGHT_TEMP'),
-            'ndvi': os.getenv('WEIGHT_NDVI')
-        }
+        env_w = _ENV_WEIGHTS
         # sensible defaults favoring NDVI slightly and rainfall
         defaults = {'ph': 0.2, 'rainfall': 0.35, 'temp': 0.2, 'ndvi': 0.25}
         # start from defaults, override with provided weights/env where present
@@ -35,14 +146,14 @@ class CropRecommender:
                 if k in weights:
                     try:
                         final[k] = float(weights[k])
-                    except:
+                    except (TypeError, ValueError):
                         pass
         # override from env if set
         for k, v in env_w.items():
             if v is not None:
                 try:
                     final[k] = float(v)
-                except:
+                except (TypeError, ValueError):
                     pass
         # normalize so weights sum to 1.0
         s = sum(final.values())
@@ -51,8 +162,82 @@ class CropRecommender:
         for k in final:
             final[k] = final[k] / s
         self.weights = final
-    
-    def recommend(self, input_params):
+        self._w = np.array([final['ph'], final['rainfall'], final['temp'], final['ndvi']])
+        # Shared by every result row (read-only)
+        self._weights_rounded = {k: round(v, 3) for k, v in final.items()}
+        if not self._load_arrays(crop_table_path):
+            self._build_arrays()
+        self._build_bands()
+        # Repeat queries (same field/snapshot) skip the scoring pass entirely
+        self._rank_cached = lru_cache(maxsize=4096)(self._rank)
+        if _NUMBA_AVAILABLE:
+            # Pay the JIT compile once here rather than on the first request
+            _score_all(0.0, 0.0, 0.0, 0.0, np.zeros((1, 3, 3)), self._w)
+
+    def _build_arrays(self):
+        """Lay the crop table out as column arrays (SoA), one slot per crop in table order"""
+        names = list(self.crop_table)
+        self._names = np.array(names)
+
+        def column(key):
+            return np.array([_as_float(self.crop_table[n].get(key)) for n in names], dtype=np.float64)
+
+        for attr, key in _COLUMNS.items():
+            setattr(self, attr, column(key))
+        self._build_listing()
+
+    def _load_arrays(self, crop_table_path):
+        """Use the prebuilt columns in <table>.npz (build_crop_npz.py) when they are
+        current for the JSON table; returns False to fall back to _build_arrays()"""
+        npz_path = npz_path_for(crop_table_path)
+        try:
+            if os.path.getmtime(npz_path) < os.path.getmtime(crop_table_path):
+                return False
+            with np.load(npz_path) as z:
+                if z['names'].tolist() != list(self.crop_table):
+                    return False
+                columns = {attr: z[attr] for attr in _COLUMNS}
+                self._names = z['names']
+        except (OSError, KeyError, ValueError):
+            return False
+        for attr, col in columns.items():
+            setattr(self, attr, col)
+        self._build_listing()
+        return True
+
+    def save_arrays(self, npz_path):
+        """Write the SoA columns to an .npz that _load_arrays() picks up at startup"""
+        np.savez(npz_path, names=self._names, **{attr: getattr(self, attr) for attr in _COLUMNS})
+
+    def _build_bands(self):
+        """Pack the static per-crop [min, max, ramp] bands into one (n_crops, 3, 3)
+        table for the scoring kernel, so ramp widths are not recomputed per query"""
+        bands = np.empty((self.ph_min.shape[0], 3, 3))
+        for j, (mn, mx) in enumerate(((self.ph_min, self.ph_max),
+                                      (self.rain_min, self.rain_max),
+                                      (self.tmin, self.tmax))):
+            bands[:, j, 0] = mn
+            bands[:, j, 1] = mx
+            bands[:, j, 2] = (mx - mn) * 0.3
+        self._bands = bands
+
+    def _build_listing(self):
+        # /api/crop/list payload, built once instead of walking crop_table per request
+        self._crops_listing = [
+            {
+                'name': n,
+                'ph_range': [self.crop_table[n].get('ph_min'), self.crop_table[n].get('ph_max')],
+                'rainfall_range_mm': [self.crop_table[n].get('rain_min_mm'), self.crop_table[n].get('rain_max_mm')],
+                'temp_range_c': [self.crop_table[n].get('tmin'), self.crop_table[n].get('tmax')]
+            }
+            for n in self.crop_table
+        ]
+
+    def list_crops(self):
+        """Return the crop parameter ranges in table order (shared list; do not mutate)"""
+        return self._crops_listing
+
+    def recommend(self, input_params, top_k=None):
         """
         input_params: dict with keys:
             - latitude
@@ -61,38 +246,93 @@ class CropRecommender:
             - rainfall
             - temp_mean
             - ndvi
+        top_k: only build result rows for the best `top_k` crops (default: all)
         Returns ranked crops and reasoning (list of dict)
+
+        Inputs are quantized (pH 0.01, rainfall 1 mm, temperature 0.1 °C,
+        NDVI 0.001) and results are memoized on that key; callers get fresh
+        copies of the cached rows.
         """
-        suitability = []
-        for crop, params in self.crop_table.items():
-            # Calculate component suitability scores (0..1)
-            ph_suit = self._scorer(input_params.get('ph'), params.get('ph_min'), params.get('ph_max'))
-            rain_suit = self._scorer(input_params.get('rainfall'), params.get('rain_min_mm'), params.get('rain_max_mm'))
-            temp_suit = self._scorer(input_params.get('temp_mean'), params.get('tmin'), params.get('tmax'))
-            ndvi_val = input_params.get('ndvi', 0.5)
-            ndvi_suit = float(ndvi_val) if ndvi_val is not None else 0.5
-            # Weighted sum
-            w = self.weights
-            overall = (ph_suit * w['ph'] + rain_suit * w['rainfall'] + temp_suit * w['temp'] + ndvi_suit * w['ndvi'])
-            suitability.append({
-                'crop': crop,
-                'score': round(overall, 3),
+        ndvi_val = input_params.get('ndvi', 0.5)
+        ndvi_suit = float(ndvi_val) if ndvi_val is not None else 0.5
+        rows = self._rank_cached(
+            _quantize(input_params.get('ph'), 2),
+            _quantize(input_params.get('rainfall'), 0),
+            _quantize(input_params.get('temp_mean'), 1),
+            round(ndvi_suit, 3),
+            top_k
+        )
+        return [dict(row, components=dict(row['components']), weights=dict(row['weights'])) for row in rows]
+
+    def _rank(self, ph, rainfall, temp_mean, ndvi_suit, top_k):
+        """Score every crop and return the ranked rows as a tuple (cached by recommend)"""
+        # Component suitability scores (0..1) and weighted sum for every crop at once
+        overall, comps = _score_all(
+            _as_float(ph),
+            _as_float(rainfall),
+            _as_float(temp_mean),
+            ndvi_suit,
+            self._bands,
+            self._w
+        )
+        ph_s, rain_s, temp_s = comps[:, 0], comps[:, 1], comps[:, 2]
+        n = overall.shape[0]
+        order = None
+        if top_k is not None and 0 < top_k < n:
+            # Crops outside all three bands share the NDVI-only floor score. When
+            # the k best in-band crops clear that floor, rank only those.
+            cand = np.flatnonzero(comps.sum(axis=1) > 0)
+            if cand.shape[0] >= top_k:
+                cand_scores = _round3(overall[cand])
+                sub = _top_k_order(cand_scores, top_k)
+                if cand_scores[sub[-1]] > round(float(ndvi_suit * self._w[3]), 3):
+                    order = cand[sub]
+                    scores = np.zeros(n)
+                    scores[cand] = cand_scores
+        if order is None:
+            scores = _round3(overall)
+            if top_k is not None and 0 < top_k < n:
+                order = _top_k_order(scores, top_k)
+            else:
+                order = np.argsort(-scores, kind='stable')[:top_k]
+
+        # Gather the selected rows column-wise and convert each column to Python
+        # floats in one tolist() call instead of boxing NumPy scalars per cell
+        ndvi_r = round(ndvi_suit, 3)
+        suitability = [
+            {
+                'crop': name,
+                'score': score,
                 'components': {
-                    'ph': round(ph_suit, 3),
-                    'rainfall': round(rain_suit, 3),
-                    'temp': round(temp_suit, 3),
-                    'ndvi': round(ndvi_suit, 3)
+                    'ph': round(c_ph, 3),
+                    'rainfall': round(c_rain, 3),
+                    'temp': round(c_temp, 3),
+                    'ndvi': ndvi_r
                 },
-                'weights': {k: round(v, 3) for k, v in self.weights.items()}
-            })
-        suitability.sort(key=lambda x: x['score'], reverse=True)
-        return suitability
+                'weights': self._weights_rounded
+            }
+            for name, score, c_ph, c_rain, c_temp in zip(
+                self._names[order].tolist(),
+                scores[order].tolist(),
+                ph_s[order].tolist(),
+                rain_s[order].tolist(),
+                temp_s[order].tolist()
+            )
+        ]
+        return tuple(suitability)
     
     @staticmethod
     def _scorer(val, minv, maxv):
         """Returns 1.0 if inside band, 0.0 if far, linear ramp otherwise"""
+        # JSON numbers are already int/float; only coerce anything else
+        if isinstance(val, (int, float)):
+            v = val
+        else:
+            try:
+                v = float(val)
+            except (TypeError, ValueError):
+                return 0.0
         try:
-            v = float(val)
             if minv <= v <= maxv:
                 return 1.0
             # Soft ramp: within 30% outside band, linearly decrease
@@ -102,5 +342,6 @@ class CropRecommender:
             if v > maxv and v - maxv < ramp:
                 return max(0.0, 1 - (v-maxv)/ramp)
             return 0.0
-        except:
+        except TypeError:
+            # Missing or non-numeric band in the crop table
             return 0.0
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the Crop Recommendation API (port 5004)
+
+Usage (from this directory):
+    gunicorn -c gunicorn_conf.py crop_flask_backend:app
+
+Set FLASK_DEV=1 and run `python crop_flask_backend.py` for the Flask
+development server instead.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('CROP_PORT', '5004')}"
+
+# gthread: processes side-step the GIL for CPU-bound scoring, threads
+# overlap the I/O-bound integrated endpoint
+worker_class = 'gthread'
+workers = int(os.getenv('CROP_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('CROP_THREADS', 8))
+timeout = 60
+
+# Import the app once in the master before forking: the crop table, SoA
+# arrays, numba-compiled kernel and encoded crop list (see warm_up() in
+# crop_flask_backend.py) are then shared copy-on-write by all workers
+preload_app = True
+
+# Also sets the app logger level (crop_flask_backend reads the same variable);
+# use warning in production to skip per-request logging entirely
+loglevel = os.getenv('CROP_LOG_LEVEL', 'info')
+accesslog = '-'
@@ -1,13 +1,21 @@
+import json
 import os
 
-from crop_recomendation import CropRecommender
+import pytest
 
+from crop_recomendation import CropRecommender, npz_path_for
 
-def test_recommender_loads_and_recommends():
-    data_path = os.path.join(os.path.dirname(__file__), 'data', 'crop_params_india.json')
-    assert os.path.exists(data_path), f"Crop params file not found at {data_path}"
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'crop_params_india.json')
 
-    recommender = CropRecommender(crop_table_path=data_path)
+
+@pytest.fixture(scope="session")
+def recommender():
+    """CropRecommender over the shipped crop table, parsed once per test session"""
+    assert os.path.exists(DATA_PATH), f"Crop params file not found at {DATA_PATH}"
+    return CropRecommender(crop_table_path=DATA_PATH)
+
+
+def test_recommender_loads_and_recommends(recommender):
     # Ensure crop table loaded
     assert isinstance(recommender.crop_table, dict)
     assert len(recommender.crop_table) > 0
@@ -32,3 +40,63 @@ def test_recommender_loads_and_recommends():
     # Ensure known crop keys are present in results
     crops = [r['crop'] for r in recs]
     assert 'rice' in crops or 'wheat' in crops
+
+
+@pytest.mark.parametrize("input_params", [
+    {'latitude': 30.8, 'longitude': 75.8, 'ph': 7.1, 'rainfall': 900, 'temp_mean': 30, 'ndvi': 0.62},
+    {'latitude': 19.5, 'longitude': 76.0, 'ph': 6.3, 'rainfall': 650, 'temp_mean': 23, 'ndvi': 0.48},
+    {'latitude': 10.5, 'longitude': 78.3, 'ph': 8.0, 'rainfall': 600, 'temp_mean': 29, 'ndvi': 0.41},
+], ids=['punjab-kharif', 'maharashtra-rabi', 'tamil-nadu-summer'])
+def test_recommendations_are_ranked(recommender, input_params):
+    recs = recommender.recommend(input_params)
+    assert len(recs) == len(recommender.crop_table)
+
+    scores = [r['score'] for r in recs]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.0 <= s <= 1.0 for s in scores)
+    assert recommender.recommend(input_params, top_k=5) == recs[:5]
+
+
+def test_vectorized_scores_match_scalar_scorer(tmp_path):
+    table = {
+        'rice': {'ph_min': 5.5, 'ph_max': 7.0, 'rain_min_mm': 1000, 'rain_max_mm': 2000, 'tmin': 20, 'tmax': 35},
+        'wheat': {'ph_min': 6.0, 'ph_max': 7.5, 'rain_min_mm': 450, 'rain_max_mm': 650, 'tmin': 12, 'tmax': 25},
+        'cotton': {'ph_min': 7.0, 'ph_max': 8.5, 'rain_min_mm': 500, 'rain_max_mm': 900, 'tmin': 21, 'tmax': 35},
+    }
+    path = tmp_path / 'crops.json'
+    path.write_text(json.dumps(table), encoding='utf-8')
+    recommender = CropRecommender(crop_table_path=str(path))
+
+    input_params = {'ph': 7.2, 'rainfall': 950, 'temp_mean': 24, 'ndvi': 0.5}
+    recs = recommender.recommend(input_params)
+    assert [r['score'] for r in recs] == sorted((r['score'] for r in recs), reverse=True)
+    for rec in recs:
+        params = table[rec['crop']]
+        assert rec['components']['ph'] == round(CropRecommender._scorer(7.2, params['ph_min'], params['ph_max']), 3)
+        assert rec['components']['rainfall'] == round(CropRecommender._scorer(950, params['rain_min_mm'], params['rain_max_mm']), 3)
+        assert rec['components']['temp'] == round(CropRecommender._scorer(24, params['tmin'], params['tmax']), 3)
+
+    top = recommender.recommend(input_params, top_k=2)
+    assert top == recs[:2]
+
+
+def test_prebuilt_npz_columns_match_json(tmp_path):
+    table = {
+        'rice': {'ph_min': 5.5, 'ph_max': 7.0, 'rain_min_mm': 1000, 'rain_max_mm': 2000, 'tmin': 20, 'tmax': 35},
+        'wheat': {'ph_min': 6.0, 'ph_max': 7.5, 'rain_min_mm': 450, 'rain_max_mm': 650, 'tmin': 12, 'tmax': 25},
+    }
+    path = tmp_path / 'crops.json'
+    path.write_text(json.dumps(table), encoding='utf-8')
+    from_json = CropRecommender(crop_table_path=str(path))
+    from_json.save_arrays(npz_path_for(str(path)))
+
+    from_npz = CropRecommender(crop_table_path=str(path))
+    assert from_npz._load_arrays(str(path))
+    input_params = {'ph': 6.2, 'rainfall': 800, 'temp_mean': 22, 'ndvi': 0.5}
+    assert from_npz.recommend(input_params) == from_json.recommend(input_params)
+    assert from_npz.list_crops() == from_json.list_crops()
+
+    # A table edited after the build no longer matches the .npz
+    table['maize'] = table['rice']
+    path.write_text(json.dumps(table), encoding='utf-8')
+    assert not CropRecommender(crop_table_path=str(path))._load_arrays(str(path))
@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for the NDVI Analysis API (port 5001)
+
+Usage (from this directory):
+    gunicorn -c gunicorn_conf.py ndvi_flask_backend:app
+
+Set FLASK_DEV=1 and run `python ndvi_flask_backend.py` for the Flask
+development server instead.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('NDVI_PORT', '5001')}"
+
+# gthread: Copernicus downloads are blocking HTTPS calls, threads overlap
+# them; processes run NumPy/matplotlib work side by side
+worker_class = 'gthread'
+workers = int(os.getenv('NDVI_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('NDVI_THREADS', 16))
+
+# Copernicus searches and downloads can take well over gunicorn's 30 s default
+timeout = 120
+
+# Import the app once in the master before forking so the calculator tables
+# and NumPy/numba imports are shared copy-on-write by the workers
+preload_app = True
+
+# Cached visualization PNGs are served from files: stream them with sendfile(2)
+sendfile = True
+
+loglevel = os.getenv('NDVI_LOG_LEVEL', 'info')
+accesslog = '-'
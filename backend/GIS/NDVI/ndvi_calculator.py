@@ -4,67 +4,264 @@ Corrected NDVI Calculator with Known Values for Test Locations
 Returns exact NDVI values for Punjab and other test locations
 """
 
+import copy
+import io
 import numpy as np
-import matplotlib.pyplot as plt
 import logging
 import os
+import re
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Optional
 
+# NDVI lives in [-1, 1] and is reported to 3-4 decimals; float32 is plenty and
+# halves the bytes moved by every statistics pass
+NDVI_DTYPE = np.float32
+
+# Optional: numba compiles the sample-data fill loop; the NumPy path is used without it
+try:
+    from numba import njit, prange
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    njit = None
+    prange = range
+    _NUMBA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+
+@lru_cache(maxsize=16)
+def _known_location_pattern(size):
+    """Spatial pattern plus noise around a known location's NDVI (read-only).
+
+    Deterministic (seed 42), so it is built once per size and shared.
+    """
+    rng = np.random.default_rng(42)  # Reproducible, without touching the global RNG
+
+    # Create base pattern: sin varies along x (columns), cos along y (rows); broadcasting
+    # the 1-D factors avoids building meshgrids and evaluating sin/cos per pixel
+    axis = np.linspace(0, 10, size)
+    pattern = (0.1 * np.sin(axis * 0.5))[np.newaxis, :] * np.cos(axis * 0.3)[:, np.newaxis]
+
+    # Add realistic noise
+    pattern += rng.normal(0, 0.05, (size, size))
+    pattern = pattern.astype(NDVI_DTYPE)
+    pattern.flags.writeable = False
+    return pattern
+
+
+# Lower bounds of the sparse / moderate / dense vegetation classes
+_COVERAGE_EDGES = np.array([0.1, 0.3, 0.6])
+
+# Fixed-range histogram shared by coverage analysis and the visualization;
+# 0.01-wide bins so the coverage class bounds fall exactly on bin edges
+HIST_BINS = 200
+HIST_RANGE = (-1.0, 1.0)
+_COVERAGE_BIN_STARTS = np.concatenate((
+    [0],
+    np.rint((_COVERAGE_EDGES - HIST_RANGE[0]) / (HIST_RANGE[1] - HIST_RANGE[0]) * HIST_BINS).astype(np.intp)
+))
+
+
+def _compute_hist(valid_ndvi):
+    """(counts, edges) of NaN-free NDVI values over HIST_RANGE in HIST_BINS bins"""
+    return np.histogram(valid_ndvi, bins=HIST_BINS, range=HIST_RANGE)
+
+
+def _coverage_counts(ndvi_values, hist_counts=None):
+    """Pixel counts for water/bare, sparse, moderate and dense.
+
+    Summed from hist_counts (see _compute_hist) when given, the values are float32 and
+    every value fell inside HIST_RANGE; otherwise one digitize/bincount pass over NaN-free
+    values. Only float32 histogram edges land exactly on the class bounds: float64 edges
+    from linspace sit just above them (0.10000000000000009), which would count values
+    equal to a bound in the lower class.
+    """
+    if (hist_counts is not None and ndvi_values.dtype == np.float32
+            and hist_counts.sum() == len(ndvi_values)):
+        return np.add.reduceat(hist_counts, _COVERAGE_BIN_STARTS)
+    return np.bincount(np.digitize(ndvi_values, _COVERAGE_EDGES), minlength=4)
+
+
+# ==================== Health classification ====================
+
+# Lower NDVI bound of Poor, Moderate, Good and Excellent; below 0.0 is Very Poor
+_HEALTH_THRESHOLDS = (0.0, 0.2, 0.4, 0.6)
+
+# (category, score, description, color, recommendations), indexed by _health_index()
+_HEALTH_TABLE = (
+    ('Very Poor', 10, 'Very poor or no vegetation detected', "#FF4500", (  # Orange Red
+        'Critical condition requiring emergency management',
+        'Immediate consultation with agricultural extension services',
+        'Consider complete crop management overhaul',
+        'Evaluate field for replanting or alternative use'
+    )),
+    ('Poor', 30, 'Poor vegetation health with significant stress', "#FFA500", (  # Orange
+        'Immediate intervention needed',
+        'Check for disease, pest, or water stress',
+        'Review management practices urgently',
+        'Consider replanting in severely affected areas'
+    )),
+    ('Moderate', 60, 'Moderate vegetation with some stress indicators', "#FFD700", (  # Gold
+        'Vegetation shows moderate stress signs',
+        'Check irrigation and fertilization programs',
+        'Consider soil testing for nutrient deficiencies',
+        'Monitor for pest and disease issues'
+    )),
+    ('Good', 80, 'Healthy vegetation with good coverage and biomass', "#90EE90", (  # Light Green
+        'Good vegetation health observed',
+        'Monitor water and nutrient levels',
+        'Consider targeted improvements in low-performing areas',
+        'Regular field scouting recommended'
+    )),
+    ('Excellent', 95, 'Very healthy, dense vegetation with optimal biomass', "#228B22", (  # Forest Green
+        'Vegetation is thriving with excellent health',
+        'Continue current management practices',
+        'Monitor for optimal harvest timing',
+        'Consider precision nutrient management'
+    )),
+)
+
+# Recommendations reported for known locations, keyed by their recorded category
+_CATEGORY_RECOMMENDATIONS = {
+    'Excellent': (
+        'Continue excellent management practices',
+        'Monitor for optimal harvest timing',
+        'Consider yield optimization techniques',
+        'Maintain current irrigation and fertilization'
+    ),
+    'Good': (
+        'Good vegetation health maintained',
+        'Regular monitoring recommended', 
+        'Consider minor adjustments to inputs',
+        'Watch for seasonal changes'
+    ),
+    'Moderate': (
+        'Address moderate stress indicators',
+        'Check water and nutrient availability',
+        'Consider soil health assessment',
+        'Monitor for pest/disease issues'
+    ),
+    'Poor': (
+        'Immediate intervention required',
+        'Comprehensive field assessment needed',
+        'Review all management practices',
+        'Consider expert consultation'
+    ),
+    'Very Poor': (
+        'Emergency management required',
+        'Immediate expert consultation needed',
+        'Consider replanting options',
+        'Comprehensive soil and crop analysis'
+    )
+}
+
+
+def _health_index(ndvi):
+    """Row of _HEALTH_TABLE for an NDVI value (NaN counts as Very Poor)"""
+    if ndvi != ndvi:
+        return 0
+    return bisect_right(_HEALTH_THRESHOLDS, ndvi)
+
+
+# Column arrays of _HEALTH_TABLE for the vectorized lookups
+_HEALTH_THRESHOLDS_ARRAY = np.array(_HEALTH_THRESHOLDS)
+_HEALTH_CATEGORIES = np.array([row[0] for row in _HEALTH_TABLE])
+_HEALTH_SCORES = np.array([row[1] for row in _HEALTH_TABLE])
+
+
+def _health_indices(ndvi_values):
+    """_health_index for a whole array in one searchsorted pass"""
+    ndvi_values = np.asarray(ndvi_values)
+    indices = np.searchsorted(_HEALTH_THRESHOLDS_ARRAY, ndvi_values, side='right')
+    # searchsorted sorts NaN above every threshold; NaN counts as Very Poor
+    return np.where(np.isnan(ndvi_values), 0, indices)
+
+
+# lat_lng as embedded in band file names, e.g. B04_30.3398_76.3869.tif
+_COORD_RE = re.compile(r'([0-9]+\.[0-9]+)_([0-9\-]+\.[0-9]+)')
+
+
+def _coord_key(lat, lng):
+    """Canonical "lat,lng" key for known_locations (4 decimals, no trailing zeros)"""
+    return f"{round(lat, 4)},{round(lng, 4)}"
+
+
+# Known NDVI values for specific coordinates (your test locations), keyed by _coord_key()
+_KNOWN_LOCATIONS = MappingProxyType({
+    "30.3398,76.3869": {  # Punjab Wheat
+        "name": "Punjab Wheat Farm",
+        "ndvi": 0.652,
+        "red_band": 0.150,
+        "nir_band": 0.350,
+        "health_category": "Excellent",
+        "health_score": 95,
+        "description": "Healthy wheat crop in prime growing condition",
+        "season": "Rabi season",
+        "crop_stage": "Grain filling"
+    },
+    "18.15,74.5777": {  # Maharashtra Sugarcane  
+        "name": "Maharashtra Sugarcane Field",
+        "ndvi": 0.718,
+        "red_band": 0.120,
+        "nir_band": 0.380,
+        "health_category": "Excellent", 
+        "health_score": 98,
+        "description": "Vigorous sugarcane with dense canopy",
+        "season": "Year-round",
+        "crop_stage": "Active growth"
+    },
+    "36.7783,-119.4179": {  # California Vineyard
+        "name": "California Vineyard",
+        "ndvi": 0.547,
+        "red_band": 0.180,
+        "nir_band": 0.310,
+        "health_category": "Good",
+        "health_score": 85,
+        "description": "Healthy vineyard with moderate density",
+        "season": "Growing season", 
+        "crop_stage": "Fruit development"
+    }
+})
+
+
 class NDVICalculator:
     def __init__(self):
         """Initialize with known NDVI values for test locations"""
-        # Known NDVI values for specific coordinates (your test locations)
-        self.known_locations = {
-            "30.3398,76.3869": {  # Punjab Wheat
-                "name": "Punjab Wheat Farm",
-                "ndvi": 0.652,
-                "red_band": 0.150,
-                "nir_band": 0.350,
-                "health_category": "Excellent",
-                "health_score": 95,
-                "description": "Healthy wheat crop in prime growing condition",
-                "season": "Rabi season",
-                "crop_stage": "Grain filling"
-            },
-            "18.15,74.5777": {  # Maharashtra Sugarcane  
-                "name": "Maharashtra Sugarcane Field",
-                "ndvi": 0.718,
-                "red_band": 0.120,
-                "nir_band": 0.380,
-                "health_category": "Excellent", 
-                "health_score": 98,
-                "description": "Vigorous sugarcane with dense canopy",
-                "season": "Year-round",
-                "crop_stage": "Active growth"
-            },
-            "36.7783,-119.4179": {  # California Vineyard
-                "name": "California Vineyard",
-                "ndvi": 0.547,
-                "red_band": 0.180,
-                "nir_band": 0.310,
-                "health_category": "Good",
-                "health_score": 85,
-                "description": "Healthy vineyard with moderate density",
-                "season": "Growing season", 
-                "crop_stage": "Fruit development"
-            }
-        }
+        # Known NDVI values for specific coordinates (shared, read-only mapping)
+        self.known_locations = _KNOWN_LOCATIONS
+        # Statistics of the shared sample arrays, per region pattern (see _sample_ndvi)
+        self._sample_stats = {}
 
-    def calculate_ndvi_from_files(self, red_band_path, nir_band_path, output_path=None):
+    def calculate_ndvi_from_files(self, red_band_path, nir_band_path, output_path=None, need_array=True):
         """
         Calculate NDVI - returns known values for test locations
+
+        With need_array=False, known locations skip building the NDVI array and its
+        statistics: 'ndvi_array' is None and 'statistics' holds only the known summary.
         """
         try:
             logger.info(f"Calculating NDVI from: {red_band_path}, {nir_band_path}")
 
             # Extract coordinates from file path if possible
             coords = self._extract_coordinates_from_path(red_band_path)
-
-            if coords and coords in self.known_locations:
-                logger.info(f"Using known NDVI data for {self.known_locations[coords]['name']}")
-                return self._get_known_location_data(coords, output_path)
+            known = self.known_locations.get(coords) if coords else None
+
+            if known is not None:
+                logger.info(f"Using known NDVI data for {known['name']}")
+                if not need_array:
+                    return {
+                        'ndvi_array': None,
+                        'statistics': self.get_known_location_summary(coords, known),
+                        'bounds': None,
+                        'crs': None,
+                        'transform': None,
+                        'output_path': output_path,
+                        'data_source': 'verified_ground_truth'
+                    }
+                return self._get_known_location_data(coords, output_path, known)
             else:
                 logger.info("Generating realistic NDVI data for unknown location")
                 return self._generate_realistic_ndvi_data(red_band_path, nir_band_path)
@@ -83,8 +280,7 @@ class NDVICalculator:
                 acquisition_date = None  # Could be used for seasonal variation later
 
             # For now, fallback to generating synthetic NDVI using realistic model
-            ndvi_array = create_sample_ndvi_data(latitude, longitude)
-            stats = self.calculate_ndvi_statistics(ndvi_array)
+            ndvi_array, stats = self._sample_ndvi(latitude, longitude)
 
             return {
                 'ndvi_array': ndvi_array,
@@ -113,22 +309,68 @@ class NDVICalculator:
         try:
             red = float(red_band)
             nir = float(nir_band)
-            denom = nir + red
-            if denom == 0:
-                logger.warning("Division by zero in NDVI calculation from bands")
-                return None
-            ndvi = (nir - red) / denom
-            return ndvi
-        except Exception as e:
+        except (TypeError, ValueError) as e:
             logger.error(f"Error calculating NDVI from bands: {e}")
             return None
+
+        denom = nir + red
+        if denom == 0:
+            logger.warning("Division by zero in NDVI calculation from bands")
             return None
+        return (nir - red) / denom
+
+    def calculate_ndvi_batch(self, red_band, nir_band) -> np.ndarray:
+        """
+        Vectorized calculate_ndvi_from_bands for whole band arrays in one pass.
+
+        Args:
+            red_band (array-like): Red band reflectance values.
+            nir_band (array-like): Near-Infrared band reflectance values (same or broadcastable shape).
+
+        Returns:
+            np.ndarray: NDVI_DTYPE array of (NIR - Red) / (NIR + Red), NaN where NIR + Red is 0.
+        """
+        return self.calculate_indices(red_band, nir_band)['ndvi']
+
+    def calculate_indices(self, red_band, nir_band, green_band=None, swir_band=None) -> dict:
+        """
+        Compute NDVI plus NDWI (with green) and NDBI (with SWIR) in a single pass over the bands.
+
+        Every index is a normalized difference against NIR, so each pixel's NIR value is read
+        once for all of them:
+            ndvi = (NIR - Red) / (NIR + Red)
+            ndwi = (Green - NIR) / (Green + NIR)
+            ndbi = (SWIR - NIR) / (SWIR + NIR)
+
+        Returns:
+            dict: index name -> NDVI_DTYPE array (NaN where the denominator is 0), only for the
+                  indices whose bands were given.
+        """
+        bands = [nir_band, red_band, green_band, swir_band]
+        present = [b is not None for b in bands]
+        arrays = np.broadcast_arrays(*(np.asarray(b, dtype=NDVI_DTYPE) for b, p in zip(bands, present) if p))
+        shape = arrays[0].shape
+        flat = iter([np.ascontiguousarray(a).reshape(-1) for a in arrays])
+        nir, red = next(flat), next(flat)
+        green = next(flat) if present[2] else _NO_BAND
+        swir = next(flat) if present[3] else _NO_BAND
+
+        out_ndvi = np.empty(nir.size, dtype=NDVI_DTYPE)
+        out_ndwi = np.empty(nir.size, dtype=NDVI_DTYPE) if present[2] else _NO_BAND
+        out_ndbi = np.empty(nir.size, dtype=NDVI_DTYPE) if present[3] else _NO_BAND
+        _indices_fill(nir, red, green, swir, out_ndvi, out_ndwi, out_ndbi)
+
+        indices = {'ndvi': out_ndvi.reshape(shape)}
+        if present[2]:
+            indices['ndwi'] = out_ndwi.reshape(shape)
+        if present[3]:
+            indices['ndbi'] = out_ndbi.reshape(shape)
+        return indices
 
     def get_health_category(self, ndvi_value: float) -> str:
         """Return the vegetation health category for given NDVI value"""
         try:
-            health_info = self.classify_vegetation_health(ndvi_value)
-            return health_info.get('category', 'Unknown')
+            return _HEALTH_TABLE[_health_index(ndvi_value)][0]
         except Exception as e:
             logger.error(f"Error getting health category: {e}")
             return 'Unknown'
@@ -136,29 +378,27 @@ class NDVICalculator:
     def get_health_score(self, ndvi_value: float) -> int:
         """Return the vegetation health score for given NDVI value"""
         try:
-            health_info = self.classify_vegetation_health(ndvi_value)
-            return health_info.get('health_score', 0)
+            return _HEALTH_TABLE[_health_index(ndvi_value)][1]
         except Exception as e:
             logger.error(f"Error getting health score: {e}")
             return 0
 
+    def get_health_categories(self, ndvi_values) -> np.ndarray:
+        """Vectorized get_health_category: category name for every NDVI value in an array"""
+        return _HEALTH_CATEGORIES[_health_indices(ndvi_values)]
+
+    def get_health_scores(self, ndvi_values) -> np.ndarray:
+        """Vectorized get_health_score: health score for every NDVI value in an array"""
+        return _HEALTH_SCORES[_health_indices(ndvi_values)]
+
     def _extract_coordinates_from_path(self, file_path):
         """Extract coordinates from file path"""
         try:
             # Look for lat_lng pattern in filename
-            import re
-            pattern = r'([0-9]+\.[0-9]+)_([0-9\-]+\.[0-9]+)'
-            match = re.search(pattern, file_path)
+            match = _COORD_RE.search(file_path)
 
             if match:
-                lat = float(match.group(1))
-                lng = float(match.group(2))
-                
-                # Normalize lat to remove trailing zeros for matching
-                if lat == 18.1500:
-                    lat = 18.15
-
-                coord_key = f"{lat},{lng}"
+                coord_key = _coord_key(float(match.group(1)), float(match.group(2)))
                 logger.info(f"Extracted coordinates: {coord_key}")
                 return coord_key
 
@@ -167,19 +407,15 @@ class NDVICalculator:
             logger.warning(f"Could not extract coordinates: {e}")
             return None
 
-    def _get_known_location_data(self, coord_key, output_path=None):
-        """Get known NDVI data for test locations"""
-        location_data = self.known_locations[coord_key]
-
-        # Generate realistic NDVI array based on known values
-        base_ndvi = location_data["ndvi"]
-        ndvi_array = self._create_ndvi_array_from_value(base_ndvi)
+    def get_known_location_summary(self, coord_key, location_data=None):
+        """Known NDVI and health analysis for a test location, without building an array
 
-        # Calculate statistics
-        stats = self.calculate_ndvi_statistics(ndvi_array)
+        location_data: the known_locations entry for coord_key, if the caller already has it.
+        """
+        if location_data is None:
+            location_data = self.known_locations[coord_key]
 
-        # Override with known values
-        stats.update(**{
+        return {
             "mean": location_data["ndvi"],
             "location_name": location_data["name"],
             "known_location": "true",
@@ -193,7 +429,22 @@ class NDVICalculator:
                 'crop_stage': location_data["crop_stage"],
                 'season': location_data["season"]
             }
-        })
+        }
+
+    def _get_known_location_data(self, coord_key, output_path=None, location_data=None):
+        """Get known NDVI data for test locations"""
+        if location_data is None:
+            location_data = self.known_locations[coord_key]
+
+        # Generate realistic NDVI array based on known values
+        base_ndvi = location_data["ndvi"]
+        ndvi_array = self._create_ndvi_array_from_value(base_ndvi)
+
+        # Calculate statistics
+        stats = self.calculate_ndvi_statistics(ndvi_array)
+
+        # Override with known values
+        stats.update(**self.get_known_location_summary(coord_key, location_data))
 
         return {
             'ndvi_array': ndvi_array,
@@ -207,21 +458,11 @@ class NDVICalculator:
 
     def _create_ndvi_array_from_value(self, target_ndvi, size=500):
         """Create realistic NDVI array centered on target value"""
-        np.random.seed(42)  # Reproducible
-
-        # Create base pattern
-        x, y = np.meshgrid(np.linspace(0, 10, size), np.linspace(0, 10, size))
-
-        # Create spatial pattern around target value
-        pattern = target_ndvi + 0.1 * np.sin(x * 0.5) * np.cos(y * 0.3)
+        # Spatial pattern + noise is the same for every target; only the offset varies
+        ndvi_array = target_ndvi + _known_location_pattern(size)
 
-        # Add realistic noise
-        noise = np.random.normal(0, 0.05, (size, size))
-        ndvi_array = pattern + noise
-
-        # Ensure values stay in reasonable range around target
-        ndvi_array = np.clip(ndvi_array, target_ndvi - 0.2, target_ndvi + 0.2)
-        ndvi_array = np.clip(ndvi_array, -1, 1)  # NDVI valid range
+        # Ensure values stay in reasonable range around target and in the NDVI valid range
+        np.clip(ndvi_array, max(-1.0, target_ndvi - 0.2), min(1.0, target_ndvi + 0.2), out=ndvi_array)
 
         return ndvi_array
 
@@ -235,8 +476,7 @@ class NDVICalculator:
             lat, lng = (float(c) for c in coords.split(',')) if coords else (35.0, -95.0)
 
         # Create generic NDVI array
-        ndvi_array = create_sample_ndvi_data(lat, lng)
-        stats = self.calculate_ndvi_statistics(ndvi_array)
+        ndvi_array, stats = self._sample_ndvi(lat, lng)
 
         return {
             'ndvi_array': ndvi_array,
@@ -248,14 +488,31 @@ class NDVICalculator:
             'data_source': 'realistic_simulation'
         }
 
+    def _sample_ndvi(self, lat, lng):
+        """
+        (sample NDVI array, statistics) for a location.
+
+        The sample only depends on the region pattern, so its statistics are computed once
+        per region and each caller gets its own copy of them.
+        """
+        params = _sample_params(lat, lng)
+        ndvi_array = _region_sample(*params, _SAMPLE_SIZE)
+        stats = self._sample_stats.get(params)
+        if stats is None:
+            stats = self._sample_stats[params] = self.calculate_ndvi_statistics(ndvi_array)
+        return ndvi_array, copy.deepcopy(stats)
+
     def calculate_ndvi_statistics(self, ndvi_array):
         """Calculate comprehensive NDVI statistics"""
-        # Remove NaN values
-        valid_ndvi = ndvi_array[~np.isnan(ndvi_array)]
+        # Remove NaN values (NaN mask built once; no gather copy when there are none)
+        nan_mask = np.isnan(ndvi_array)
+        valid_pixels = ndvi_array.size - int(np.count_nonzero(nan_mask))
 
-        if len(valid_ndvi) == 0:
+        if valid_pixels == 0:
             return {"error": "No valid NDVI values found"}
 
+        valid_ndvi = ndvi_array[~nan_mask] if valid_pixels < ndvi_array.size else ndvi_array.ravel()
+
         # Basic statistics
         stats = {
             'mean': float(np.mean(valid_ndvi)),
@@ -263,7 +520,7 @@ class NDVICalculator:
             'std': float(np.std(valid_ndvi)),
             'min': float(np.min(valid_ndvi)),
             'max': float(np.max(valid_ndvi)),
-            'valid_pixels': int(len(valid_ndvi)),
+            'valid_pixels': valid_pixels,
             'total_pixels': int(ndvi_array.size)
         }
 
@@ -271,7 +528,8 @@ class NDVICalculator:
         stats['health_analysis'] = self.classify_vegetation_health(stats['mean'])
 
         # Vegetation coverage
-        stats['vegetation_coverage'] = self.analyze_vegetation_coverage(valid_ndvi)
+        hist_counts, _ = _compute_hist(valid_ndvi)
+        stats['vegetation_coverage'] = self.analyze_vegetation_coverage(valid_ndvi, hist_counts)
 
         # Trend analysis
         stats['trend_analysis'] = self.analyze_ndvi_trends(valid_ndvi)
@@ -280,214 +538,126 @@ class NDVICalculator:
 
     def classify_vegetation_health(self, mean_ndvi):
         """Classify vegetation health based on NDVI"""
-        if mean_ndvi >= 0.6:
-            category = 'Excellent'
-            score = 95
-            description = 'Very healthy, dense vegetation with optimal biomass'
-            recommendations = [
-                'Vegetation is thriving with excellent health',
-                'Continue current management practices',
-                'Monitor for optimal harvest timing',
-                'Consider precision nutrient management'
-            ]
-        elif mean_ndvi >= 0.4:
-            category = 'Good'
-            score = 80
-            description = 'Healthy vegetation with good coverage and biomass'
-            recommendations = [
-                'Good vegetation health observed',
-                'Monitor water and nutrient levels',
-                'Consider targeted improvements in low-performing areas',
-                'Regular field scouting recommended'
-            ]
-        elif mean_ndvi >= 0.2:
-            category = 'Moderate'
-            score = 60
-            description = 'Moderate vegetation with some stress indicators'
-            recommendations = [
-                'Vegetation shows moderate stress signs',
-                'Check irrigation and fertilization programs',
-                'Consider soil testing for nutrient deficiencies',
-                'Monitor for pest and disease issues'
-            ]
-        elif mean_ndvi >= 0.0:
-            category = 'Poor'
-            score = 30
-            description = 'Poor vegetation health with significant stress'
-            recommendations = [
-                'Immediate intervention needed',
-                'Check for disease, pest, or water stress',
-                'Review management practices urgently',
-                'Consider replanting in severely affected areas'
-            ]
-        else:
-            category = 'Very Poor'
-            score = 10
-            description = 'Very poor or no vegetation detected'
-            recommendations = [
-                'Critical condition requiring emergency management',
-                'Immediate consultation with agricultural extension services',
-                'Consider complete crop management overhaul',
-                'Evaluate field for replanting or alternative use'
-            ]
+        category, score, description, color, recommendations = _HEALTH_TABLE[_health_index(mean_ndvi)]
 
         return {
             'category': category,
             'health_score': score,
             'description': description,
-            'color': self._get_health_color(mean_ndvi),
-            'recommendations': recommendations
+            'color': color,
+            'recommendations': list(recommendations)
         }
 
     def _get_health_color(self, ndvi):
         """Get color for NDVI value"""
-        if ndvi >= 0.6:
-            return "#228B22"  # Forest Green
-        elif ndvi >= 0.4:
-            return "#90EE90"  # Light Green
-        elif ndvi >= 0.2:
-            return "#FFD700"  # Gold
-        elif ndvi >= 0.0:
-            return "#FFA500"  # Orange
-        else:
-            return "#FF4500"  # Orange Red
+        return _HEALTH_TABLE[_health_index(ndvi)][3]
 
     def _get_recommendations_for_category(self, category):
         """Get recommendations based on category"""
-        recommendations = {
-            'Excellent': [
-                'Continue excellent management practices',
-                'Monitor for optimal harvest timing',
-                'Consider yield optimization techniques',
-                'Maintain current irrigation and fertilization'
-            ],
-            'Good': [
-                'Good vegetation health maintained',
-                'Regular monitoring recommended', 
-                'Consider minor adjustments to inputs',
-                'Watch for seasonal changes'
-            ],
-            'Moderate': [
-                'Address moderate stress indicators',
-                'Check water and nutrient availability',
-                'Consider soil health assessment',
-                'Monitor for pest/disease issues'
-            ],
-            'Poor': [
-                'Immediate intervention required',
-                'Comprehensive field assessment needed',
-                'Review all management practices',
-                'Consider expert consultation'
-            ],
-            'Very Poor': [
-                'Emergency management required',
-                'Immediate expert consultation needed',
-                'Consider replanting options',
-                'Comprehensive soil and crop analysis'
-            ]
-        }
-        return recommendations.get(category, ['Monitor vegetation health closely'])
+        return list(_CATEGORY_RECOMMENDATIONS.get(category, ('Monitor vegetation health closely',)))
 
-    def analyze_vegetation_coverage(self, ndvi_values):
-        """Analyze vegetation coverage distribution"""
+    def analyze_vegetation_coverage(self, ndvi_values, hist_counts=None):
+        """Analyze vegetation coverage distribution (optionally from a _compute_hist histogram)"""
         total = len(ndvi_values)
 
-        water_bare = np.sum(ndvi_values < 0.1) / total * 100
-        sparse_veg = np.sum((ndvi_values >= 0.1) & (ndvi_values < 0.3)) / total * 100
-        moderate_veg = np.sum((ndvi_values >= 0.3) & (ndvi_values < 0.6)) / total * 100
-        dense_veg = np.sum(ndvi_values >= 0.6) / total * 100
+        # Percentages in tenths, rounded half up with integer arithmetic on the counts
+        pct_x10 = (_coverage_counts(ndvi_values, hist_counts).astype(np.int64) * 2000 + total) // (2 * total)
+        water_bare, sparse_veg, moderate_veg, dense_veg = pct_x10.tolist()
 
         return {
-            'water_bare_soil': round(water_bare, 1),
-            'sparse_vegetation': round(sparse_veg, 1),
-            'moderate_vegetation': round(moderate_veg, 1), 
-            'dense_vegetation': round(dense_veg, 1)
+            'water_bare_soil': water_bare / 10,
+            'sparse_vegetation': sparse_veg / 10,
+            'moderate_vegetation': moderate_veg / 10, 
+            'dense_vegetation': dense_veg / 10
         }
 
     def analyze_ndvi_trends(self, ndvi_values):
         """Analyze NDVI trends and distribution"""
         percentiles = np.percentile(ndvi_values, [10, 25, 50, 75, 90])
+        std = float(np.std(ndvi_values))
 
         return {
-            'p10': round(percentiles[0], 3),
-            'p25': round(percentiles[1], 3),
-            'p50': round(percentiles[2], 3),
-            'p75': round(percentiles[3], 3),
-            'p90': round(percentiles[4], 3),
-            'variability': 'High' if np.std(ndvi_values) > 0.2 else 'Moderate' if np.std(ndvi_values) > 0.1 else 'Low',
-            'uniformity': 'Good' if np.std(ndvi_values) < 0.1 else 'Variable'
+            'p10': round(float(percentiles[0]), 3),
+            'p25': round(float(percentiles[1]), 3),
+            'p50': round(float(percentiles[2]), 3),
+            'p75': round(float(percentiles[3]), 3),
+            'p90': round(float(percentiles[4]), 3),
+            'variability': 'High' if std > 0.2 else 'Moderate' if std > 0.1 else 'Low',
+            'uniformity': 'Good' if std < 0.1 else 'Variable'
         }
 
-    def generate_ndvi_visualization(self, ndvi_array, output_path=None):
-        """Generate NDVI visualization"""
+    def generate_ndvi_visualization(self, ndvi_array, output_path=None, hist=None):
+        """Generate NDVI visualization (returns the shared Figure)
+
+        output_path: PNG file path or binary file object (e.g. io.BytesIO) to save to.
+        hist: (counts, edges) from _compute_hist for this array, if already computed.
+        """
         try:
-            plt.figure(figsize=(15, 10))
-
-            # NDVI map
-            plt.subplot(2, 3, 1)
-            im = plt.imshow(ndvi_array, cmap='RdYlGn', vmin=-1, vmax=1)
-            plt.colorbar(im, label='NDVI Value')
-            plt.title('NDVI Map', fontsize=14, fontweight='bold')
-            plt.axis('off')
-
-            # Histogram
-            plt.subplot(2, 3, 2)
-            valid_ndvi = ndvi_array[~np.isnan(ndvi_array)]
-            plt.hist(valid_ndvi, bins=50, alpha=0.7, color='darkgreen', edgecolor='black')
-            plt.xlabel('NDVI Value')
-            plt.ylabel('Frequency')
-            plt.title('NDVI Distribution', fontsize=14, fontweight='bold')
-            plt.grid(True, alpha=0.3)
-
-            # Statistics panel
-            plt.subplot(2, 3, 3)
-            stats_text = f"""NDVI Statistics:
-
-Mean: {np.nanmean(ndvi_array):.3f}
-Median: {np.nanmedian(ndvi_array):.3f}
-Std Dev: {np.nanstd(ndvi_array):.3f}
-Min: {np.nanmin(ndvi_array):.3f}
-Max: {np.nanmax(ndvi_array):.3f}
-
-Valid Pixels: {np.sum(~np.isnan(ndvi_array)):,}
-Total Pixels: {ndvi_array.size:,}
-            """
-            plt.text(0.05, 0.95, stats_text, transform=plt.gca().transAxes, 
-                    fontsize=11, verticalalignment='top', fontfamily='monospace')
-            plt.axis('off')
-
-            # Health categories pie chart
-            plt.subplot(2, 3, 4)
-            water_bare = np.sum(valid_ndvi < 0.1)
-            sparse = np.sum((valid_ndvi >= 0.1) & (valid_ndvi < 0.3))
-            moderate = np.sum((valid_ndvi >= 0.3) & (valid_ndvi < 0.6))
-            dense = np.sum(valid_ndvi >= 0.6)
-
-            categories = ['Water/Bare', 'Sparse Veg', 'Moderate Veg', 'Dense Veg']
-            values = [water_bare, sparse, moderate, dense]
-            colors = ['#8B4513', '#FFD700', '#90EE90', '#228B22']
-
-            plt.pie(values, labels=categories, colors=colors, autopct='%1.1f%%')
-            plt.title('Vegetation Coverage', fontsize=14, fontweight='bold')
-
-            # NDVI zones
-            plt.subplot(2, 3, 5)
-            zones = np.zeros_like(ndvi_array)
-            zones[ndvi_array < 0.1] = 0  # Water/bare
-            zones[(ndvi_array >= 0.1) & (ndvi_array < 0.3)] = 1  # Sparse
-            zones[(ndvi_array >= 0.3) & (ndvi_array < 0.6)] = 2  # Moderate  
-            zones[ndvi_array >= 0.6] = 3  # Dense
-
-            plt.imshow(zones, cmap='terrain')
-            plt.title('Vegetation Zones', fontsize=14, fontweight='bold')
-            plt.axis('off')
-
-            # Health assessment
-            plt.subplot(2, 3, 6)
+            nan_mask = np.isnan(ndvi_array)
+            valid_ndvi = ndvi_array[~nan_mask]
+            hist_counts, hist_edges = hist if hist is not None else _compute_hist(valid_ndvi)
+
+            # Plot only the occupied part of the fixed [-1, 1] range
+            occupied = np.flatnonzero(hist_counts)
+            lo, hi = (occupied[0], occupied[-1] + 1) if occupied.size else (0, len(hist_counts))
             mean_ndvi = np.nanmean(ndvi_array)
             health_info = self.classify_vegetation_health(mean_ndvi)
 
-            health_text = f"""Health Assessment:
+            fig, axes, ndvi_image = _get_visualization_figure()
+            ax_hist, ax_stats, ax_pie, ax_zones, ax_health = axes
+
+            with _VIZ_LOCK:
+                # NDVI map (image, colorbar and title are kept between calls)
+                ndvi_image.set_data(ndvi_array)
+                ndvi_image.set_extent((-0.5, ndvi_array.shape[1] - 0.5, ndvi_array.shape[0] - 0.5, -0.5))
+
+                for ax in axes:
+                    ax.clear()
+
+                # Histogram
+                ax_hist.bar(hist_edges[lo:hi], hist_counts[lo:hi], width=np.diff(hist_edges[lo:hi + 1]), align='edge',
+                            alpha=0.7, color='darkgreen', edgecolor='black')
+                ax_hist.set_xlabel('NDVI Value')
+                ax_hist.set_ylabel('Frequency')
+                ax_hist.set_title('NDVI Distribution', fontsize=14, fontweight='bold')
+                ax_hist.grid(True, alpha=0.3)
+
+                # Statistics panel
+                stats_text = f"""NDVI Statistics:
+
+Mean: {mean_ndvi:.3f}
+Median: {np.median(valid_ndvi):.3f}
+Std Dev: {np.std(valid_ndvi):.3f}
+Min: {np.min(valid_ndvi):.3f}
+Max: {np.max(valid_ndvi):.3f}
+
+Valid Pixels: {valid_ndvi.size:,}
+Total Pixels: {ndvi_array.size:,}
+                """
+                ax_stats.text(0.05, 0.95, stats_text, transform=ax_stats.transAxes,
+                              fontsize=11, verticalalignment='top', fontfamily='monospace')
+                ax_stats.axis('off')
+
+                # Health categories pie chart
+                categories = ['Water/Bare', 'Sparse Veg', 'Moderate Veg', 'Dense Veg']
+                values = _coverage_counts(valid_ndvi, hist_counts)
+                colors = ['#8B4513', '#FFD700', '#90EE90', '#228B22']
+
+                ax_pie.pie(values, labels=categories, colors=colors, autopct='%1.1f%%')
+                ax_pie.set_title('Vegetation Coverage', fontsize=14, fontweight='bold')
+
+                # NDVI zones
+                # 0 water/bare, 1 sparse, 2 moderate, 3 dense; NaN pixels shown as 0
+                zones = np.digitize(ndvi_array, _COVERAGE_EDGES).astype(np.uint8)
+                if valid_ndvi.size < ndvi_array.size:
+                    zones[nan_mask] = 0
+
+                ax_zones.imshow(zones, cmap='terrain')
+                ax_zones.set_title('Vegetation Zones', fontsize=14, fontweight='bold')
+                ax_zones.axis('off')
+
+                # Health assessment
+                health_text = f"""Health Assessment:
 
 Category: {health_info['category']}
 Score: {health_info['health_score']}/100
@@ -497,52 +667,211 @@ Score: {health_info['health_score']}/100
 Key Recommendations:
 • {health_info['recommendations'][0]}
 • {health_info['recommendations'][1]}
-            """
+                """
 
-            plt.text(0.05, 0.95, health_text, transform=plt.gca().transAxes,
-                    fontsize=10, verticalalignment='top')
-            plt.axis('off')
+                ax_health.text(0.05, 0.95, health_text, transform=ax_health.transAxes,
+                               fontsize=10, verticalalignment='top')
+                ax_health.axis('off')
 
-            plt.tight_layout()
+                fig.tight_layout()
 
-            if output_path:
-                plt.savefig(output_path, dpi=300, bbox_inches='tight')
-                logger.info(f"Visualization saved to: {output_path}")
+                if output_path is not None:
+                    fig.savefig(output_path, format='png', dpi=VISUALIZATION_DPI, bbox_inches='tight')
+                    logger.info(f"Visualization saved to: {output_path}")
 
-            return plt
+            return fig
 
         except Exception as e:
             logger.error(f"Visualization failed: {e}")
             return None
 
 
-def create_sample_ndvi_data(lat, lng, size=500):
-    """Create sample NDVI data based on geographic location"""
-    np.random.seed(42)  # Reproducible
+# ==================== Visualization figure ====================
+
+# 150 dpi is plenty for the web dashboard and a quarter of the pixels of 300
+VISUALIZATION_DPI = 150
+
+# The figure is reused across calls; Flask serves requests on several threads
+_VIZ_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _get_visualization_figure():
+    """Build the 2x3 report figure once.
+
+    Returns (figure, [histogram, statistics, pie, zones, health] axes, NDVI map image).
+    Uses Figure + Agg canvas directly so nothing is registered with pyplot and the
+    figure is never leaked by a missing plt.close().
+    """
+    # Imported here: matplotlib costs hundreds of ms at import and most callers never render.
+    # Figure + Agg canvas need no backend selection, so no GUI backend is probed either.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(15, 10))
+    FigureCanvasAgg(fig)
+    grid = fig.subplots(2, 3)
+
+    # NDVI map: colormap, norm and colorbar never change, only the pixels do
+    ax_map = grid[0, 0]
+    ndvi_image = ax_map.imshow(np.zeros((1, 1)), cmap='RdYlGn', vmin=-1, vmax=1)
+    fig.colorbar(ndvi_image, ax=ax_map, label='NDVI Value')
+    ax_map.set_title('NDVI Map', fontsize=14, fontweight='bold')
+    ax_map.axis('off')
+
+    axes = [grid[0, 1], grid[0, 2], grid[1, 0], grid[1, 1], grid[1, 2]]
+    return fig, axes, ndvi_image
+
+
+
+def init_visualization_worker():
+    """Process-pool initializer: pay the matplotlib import and figure setup up front"""
+    _get_visualization_figure()
+
+
+def render_ndvi_visualization(latitude, longitude):
+    """Model NDVI for the coordinates and return its report as PNG bytes.
+
+    Module-level so a ProcessPoolExecutor can run it. Raises RuntimeError on failure.
+    """
+    calculator = NDVICalculator()
+    ndvi_data = calculator.calculate_ndvi(latitude, longitude)
+    if not ndvi_data:
+        raise RuntimeError('NDVI calculation failed')
+    buffer = io.BytesIO()
+    if calculator.generate_ndvi_visualization(ndvi_data['ndvi_array'], buffer) is None:
+        raise RuntimeError('Visualization failed')
+    return buffer.getvalue()
+
+
+# Location-based NDVI patterns for create_sample_ndvi_data:
+# (lat range, lng range, base NDVI, amplitude, x frequency, y frequency)
+_SAMPLE_REGIONS = (
+    ((8, 20), (70, 80), 0.7, 0.15, 0.6, 0.4),        # Tropical India (Kerala-like)
+    ((25, 28), (70, 78), 0.38, 0.1, 0.2, 0.8),       # Arid/Semi-Arid India (Rajasthan-like)
+    ((28, 32), (75, 80), 0.6, 0.2, 0.5, 0.3),        # Temperate India (Punjab-like)
+    ((35, 45), (-100, -80), 0.75, 0.1, 0.3, 0.5),    # US Corn Belt
+)
+_SAMPLE_FALLBACK = (0.4, 0.15, 0.4, 0.4)  # Generic fallback
+_SAMPLE_SIZE = 500
+
+
+def _sample_fill_numpy(out, base, amp, sin_x, cos_y, noise):
+    """out = clip(base + amp*sin(x)*cos(y) + noise, -1, 1) with NumPy broadcasting"""
+    np.multiply(amp * sin_x[np.newaxis, :], cos_y[:, np.newaxis], out=out)
+    out += base
+    out += noise
+    np.clip(out, -1, 1, out=out)
+
+
+def _sample_fill_loop(out, base, amp, sin_x, cos_y, noise):
+    """Same as _sample_fill_numpy in one pass without temporaries (compiled by numba)"""
+    rows, cols = out.shape
+    for i in prange(rows):
+        for j in range(cols):
+            v = base + amp * sin_x[j] * cos_y[i] + noise[i, j]
+            out[i, j] = min(max(v, -1.0), 1.0)
+
+
+# Eager signatures: compiled at import, which gunicorn's preload_app does once in the
+# master, not on the first request. No cache=True: the module is also loaded by file
+# path (Soil, backend/ndvi), and numba's disk cache then breaks later plain imports.
+_sample_fill = (njit('void(float32[:, ::1], float64, float64, float32[::1], float32[::1], float32[:, ::1])',
+                     parallel=True)(_sample_fill_loop)
+                if _NUMBA_AVAILABLE else _sample_fill_numpy)
+
+
+# ==================== Band indices ====================
+
+# Placeholder for bands/outputs calculate_indices was not asked for (size 0 = skip)
+_NO_BAND = np.empty(0, dtype=NDVI_DTYPE)
+
+
+def _normalized_difference(a, b, out):
+    """out = (a - b) / (a + b), NaN where a + b is 0"""
+    denom = a + b
+    out.fill(np.nan)
+    np.divide(a - b, denom, out=out, where=denom != 0)
+
+
+# Pixels per block in the NumPy fallback: one 256x256 tile, so the per-index
+# temporaries stay cache-sized instead of scene-sized
+_INDICES_BLOCK = 256 * 256
+
+
+def _indices_fill_numpy(nir, red, green, swir, out_ndvi, out_ndwi, out_ndbi):
+    """NDVI and optional NDWI/NDBI into flat outputs, one NumPy expression per index and block"""
+    for start in range(0, nir.size, _INDICES_BLOCK):
+        block = slice(start, start + _INDICES_BLOCK)
+        n = nir[block]
+        _normalized_difference(n, red[block], out_ndvi[block])
+        if out_ndwi.size:
+            _normalized_difference(green[block], n, out_ndwi[block])
+        if out_ndbi.size:
+            _normalized_difference(swir[block], n, out_ndbi[block])
+
+
+def _indices_fill_loop(nir, red, green, swir, out_ndvi, out_ndwi, out_ndbi):
+    """Same as _indices_fill_numpy in one pass over the pixels (compiled by numba)"""
+    with_ndwi = out_ndwi.size > 0
+    with_ndbi = out_ndbi.size > 0
+    for i in prange(nir.size):
+        n = nir[i]
+        d = n + red[i]
+        out_ndvi[i] = (n - red[i]) / d if d != 0 else np.nan
+        if with_ndwi:
+            d = green[i] + n
+            out_ndwi[i] = (green[i] - n) / d if d != 0 else np.nan
+        if with_ndbi:
+            d = swir[i] + n
+            out_ndbi[i] = (swir[i] - n) / d if d != 0 else np.nan
+
+
+_indices_fill = (njit('void(' + ', '.join(['float32[::1]'] * 7) + ')',
+                      parallel=True)(_indices_fill_loop)
+                 if _NUMBA_AVAILABLE else _indices_fill_numpy)
+
+
+def _sample_params(lat, lng):
+    """(base, amp, fx, fy) of the region pattern the coordinates fall in"""
+    for (lat_lo, lat_hi), (lng_lo, lng_hi), base, amp, fx, fy in _SAMPLE_REGIONS:
+        if lat_lo <= lat <= lat_hi and lng_lo <= lng <= lng_hi:
+            return base, amp, fx, fy
+    return _SAMPLE_FALLBACK
+
+
+def sample_pattern_key(lat, lng):
+    """Hashable key of the sample pattern for a location: equal keys give identical sample data"""
+    return _sample_params(lat, lng)
+
+
+def create_sample_ndvi_data(lat, lng, size=_SAMPLE_SIZE):
+    """
+    Create sample NDVI data based on geographic location.
+
+    The sample only depends on the region the coordinates fall in, so the array is built
+    once per (region, size) and shared: it is read-only, copy it before modifying.
+    """
+    return _region_sample(*_sample_params(lat, lng), size)
 
-    # Generate patterns based on location
-    x, y = np.meshgrid(np.linspace(0, 10, size), np.linspace(0, 10, size))
 
-    # More detailed location-based NDVI patterns
-    if 8 <= lat <= 20 and 70 <= lng <= 80:  # Tropical India (Kerala-like)
-        base_ndvi = 0.7 + 0.15 * np.sin(x * 0.6) * np.cos(y * 0.4)
-    elif 25 <= lat <= 28 and 70 <= lng <= 78: # Arid/Semi-Arid India (Rajasthan-like)
-        base_ndvi = 0.38 + 0.1 * np.sin(x * 0.2) * np.cos(y * 0.8)
-    elif 28 <= lat <= 32 and 75 <= lng <= 80: # Temperate India (Punjab-like)
-        base_ndvi = 0.6 + 0.2 * np.sin(x * 0.5) * np.cos(y * 0.3)
-    elif 35 <= lat <= 45 and -100 <= lng <= -80: # US Corn Belt
-        base_ndvi = 0.75 + 0.1 * np.sin(x * 0.3) * np.cos(y * 0.5)
-    else:
-        # Generic fallback
-        base_ndvi = 0.4 + 0.15 * np.sin(x * 0.4) * np.cos(y * 0.4)
+@lru_cache(maxsize=32)
+def _region_sample(base, amp, fx, fy, size):
+    """Read-only sample NDVI array for one region's pattern parameters"""
+    rng = np.random.default_rng(42)  # Reproducible, without touching the global RNG
 
-    # Add noise
-    noise = np.random.normal(0, 0.1, (size, size))
-    ndvi_sample = base_ndvi + noise
+    # The pattern is separable: sin only varies along x (columns), cos along y (rows)
+    axis = np.linspace(0, 10, size, dtype=NDVI_DTYPE)
+    sin_x = np.sin(axis * fx)
+    cos_y = np.cos(axis * fy)
 
-    # Clip to valid range
-    ndvi_sample = np.clip(ndvi_sample, -1, 1)
+    # Add noise and clip to valid range
+    noise = rng.standard_normal((size, size), dtype=NDVI_DTYPE)
+    noise *= 0.1
+    ndvi_sample = np.empty((size, size), dtype=NDVI_DTYPE)
+    _sample_fill(ndvi_sample, base, amp, sin_x, cos_y, noise)
 
+    ndvi_sample.setflags(write=False)
     return ndvi_sample
 
 
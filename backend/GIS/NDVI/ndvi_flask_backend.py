@@ -3,17 +3,53 @@
 CORRECTED Flask Backend for NDVI Analysis
 Prioritizes REAL Copernicus data, falls back to synthetic only when necessary
 """
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
+import base64
+import re
+import gzip
+import hashlib
+import io
 import logging
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import multiprocessing
+from typing import Annotated, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from functools import lru_cache
 import numpy as np
 from dotenv import load_dotenv
 
+# Optional: cachetools provides the TTL cache for analyze responses
+try:
+    from cachetools import TTLCache
+except ImportError:
+    TTLCache = None
+
+# Optional: orjson encodes responses several times faster than stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: msgspec parses and validates request bodies in compiled code
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
 # Import modules
 from sentinel_downloader import CopernicusDataDownloader
-from ndvi_calculator import NDVICalculator
+from ndvi_calculator import (NDVICalculator, init_visualization_worker, render_ndvi_visualization,
+                             sample_pattern_key)
 
 # Load environment variables: prefer backend/.env, fall back to backend/file.env
 dotenv_candidates = [
@@ -28,22 +64,39 @@ for p in dotenv_candidates:
         loaded_dotenv = p
         break
 
+# Configure logging (INFO by default; NDVI_LOG_LEVEL=DEBUG to trace Copernicus queries).
+# basicConfig is a no-op when an imported module already configured the root logger,
+# so the level is also set explicitly.
+LOG_LEVEL = os.getenv('NDVI_LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL)
+logging.getLogger().setLevel(LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
 # Record which dotenv was loaded for debugging
 if loaded_dotenv:
-    logging.basicConfig(level=logging.DEBUG)
-    logger = logging.getLogger(__name__)
     logger.info(f"✅ Loaded environment variables from: {loaded_dotenv}")
 else:
-    logging.basicConfig(level=logging.DEBUG)
-    logger = logging.getLogger(__name__)
     logger.warning("⚠️  No dotenv file found in expected locations; relying on process environment")
 
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (numpy scalars/arrays encoded natively)"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 CORS(app)
 
-# Configure logging (DEBUG to capture downloader internals)
-# Note: set to DEBUG temporarily to help diagnose Copernicus queries
-logger = logging.getLogger(__name__)
+# Behind Apache/lighttpd (mod_xsendfile), let the front server stream cached PNGs itself
+app.config['USE_X_SENDFILE'] = os.getenv('NDVI_USE_X_SENDFILE', 'false').lower() in ['1', 'true', 'yes']
 
 # Log presence of key environment variables for debugging
 def log_env_vars():
@@ -61,247 +114,789 @@ log_env_vars()
 downloader = CopernicusDataDownloader()
 calculator = NDVICalculator()
 
+# Rendered visualization PNGs, keyed by the sample pattern the coordinates map to, so the
+# directory holds one file per pattern; files older than the TTL are swept on each render
+VIZ_CACHE_DIR = os.getenv('NDVI_VIZ_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ndvi_viz'))
+VIZ_CACHE_TTL = int(os.getenv('NDVI_VIZ_CACHE_TTL', 86400))
+os.makedirs(VIZ_CACHE_DIR, exist_ok=True)
+
+# Rendering holds the GIL, so cache misses are rendered in worker processes (0 = in-thread).
+# The pool is created on first use, so each gunicorn worker gets its own after it forks.
+VIZ_PROCESSES = int(os.getenv('NDVI_VIZ_PROCESSES', min(4, os.cpu_count() or 1)))
+VIZ_RENDER_TIMEOUT = int(os.getenv('NDVI_VIZ_RENDER_TIMEOUT', 30))
+_viz_pool = None
+_viz_pool_lock = threading.Lock()
+
+
+def remove_expired_files(directory, ttl):
+    """Delete files in directory last modified more than ttl seconds ago"""
+    cutoff = time.time() - ttl
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass  # Already removed by another worker
+
+
+def write_file_atomic(path, data):
+    """Write bytes to path via a temp file in the same directory, so readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def get_viz_pool():
+    """Process pool for visualization rendering (None when disabled)"""
+    global _viz_pool
+    if VIZ_PROCESSES <= 0:
+        return None
+    with _viz_pool_lock:
+        if _viz_pool is None:
+            # forkserver: never fork this multi-threaded server process directly
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _viz_pool = ProcessPoolExecutor(max_workers=VIZ_PROCESSES, mp_context=context,
+                                            initializer=init_visualization_worker)
+            logger.info(f"🖼️  Started visualization pool with {VIZ_PROCESSES} processes")
+        return _viz_pool
+
+
+def discard_viz_pool(pool):
+    """Drop a broken visualization pool so the next render starts a fresh one"""
+    global _viz_pool
+    with _viz_pool_lock:
+        if _viz_pool is pool:
+            _viz_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_visualization(latitude, longitude):
+    """Render the report PNG in the process pool (in this thread when disabled).
+
+    A render process that died breaks the whole pool; it is replaced and the
+    render retried once. Raises concurrent.futures.TimeoutError after
+    NDVI_VIZ_RENDER_TIMEOUT seconds.
+    """
+    for attempt in range(2):
+        pool = get_viz_pool()
+        if pool is None:
+            return render_ndvi_visualization(latitude, longitude)
+        try:
+            future = pool.submit(render_ndvi_visualization, latitude, longitude)
+            try:
+                return future.result(timeout=VIZ_RENDER_TIMEOUT)
+            except FutureTimeoutError:
+                future.cancel()
+                raise
+        except BrokenProcessPool:
+            logger.warning("⚠️  Visualization pool broken (a render process died), restarting it")
+            discard_viz_pool(pool)
+            if attempt:
+                raise
+
+# Serialized /api/ndvi/analyze responses for simulated/modeled results, keyed by
+# (lat, lng rounded to 4 decimals, date). Real Copernicus results are never cached.
+# Synthetic bodies carry the whole NDVI array (~2.6 MB), so the cache is bounded by the
+# total size of its bodies (NDVI_ANALYZE_CACHE_BYTES per worker), not by entry count.
+ANALYZE_CACHE_TTL = int(os.getenv('NDVI_ANALYZE_CACHE_TTL', 300))
+ANALYZE_CACHE_BYTES = int(os.getenv('NDVI_ANALYZE_CACHE_BYTES', 64 * 1024 * 1024))
+_analyze_cache = (TTLCache(maxsize=ANALYZE_CACHE_BYTES, ttl=ANALYZE_CACHE_TTL, getsizeof=len)
+                  if TTLCache else None)
+_analyze_cache_lock = threading.Lock()
+
+# JSON responses of at least NDVI_COMPRESS_MIN_SIZE bytes are gzipped for clients that accept it.
+# Level 1 already halves the synthetic NDVI array payload at a fraction of level 6's CPU cost;
+# cached analyze bodies keep their compressed form so hits are not recompressed.
+COMPRESS_MIN_SIZE = int(os.getenv('NDVI_COMPRESS_MIN_SIZE', 500))
+COMPRESS_LEVEL = int(os.getenv('NDVI_COMPRESS_LEVEL', 1))
+_analyze_gzip_cache = (TTLCache(maxsize=ANALYZE_CACHE_BYTES // 2, ttl=ANALYZE_CACHE_TTL, getsizeof=len)
+                       if TTLCache else None)
+
+
+def cache_put(cache, key, value):
+    """Store value in a size-bounded cache; values larger than the whole cache are skipped"""
+    try:
+        cache[key] = value
+    except ValueError:
+        pass  # cachetools: value too large
+
+# Background analyses submitted with {"async": true}, polled via /api/ndvi/jobs/<id>.
+# Job state lives in files under NDVI_JOB_DIR (<id>.running, then <id>.json or <id>.error)
+# so a poll can be answered by any gunicorn worker, not just the one that ran the job;
+# put the directory on shared storage when workers span hosts. Files older than
+# NDVI_JOB_TTL seconds are removed.
+_job_executor = ThreadPoolExecutor(max_workers=int(os.getenv('NDVI_JOB_WORKERS', 4)),
+                                   thread_name_prefix='ndvi-job')
+JOB_DIR = os.getenv('NDVI_JOB_DIR', os.path.join(tempfile.gettempdir(), 'ndvi_jobs'))
+JOB_TTL = int(os.getenv('NDVI_JOB_TTL', 3600))
+# A job still 'running' after this long (gunicorn's worker timeout, see gunicorn_conf.py)
+# lost its worker: it is reported as failed rather than polled for the rest of JOB_TTL
+JOB_TIMEOUT = int(os.getenv('NDVI_JOB_TIMEOUT', 120))
+os.makedirs(JOB_DIR, exist_ok=True)
+
+# Successful Sentinel-2 downloads keyed by (lat, lng rounded to 4 decimals, window, bands), so
+# repeated analyses and timeseries replays reuse one fetch for NDVI_SENTINEL_CACHE_TTL seconds
+SENTINEL_CACHE_TTL = int(os.getenv('NDVI_SENTINEL_CACHE_TTL', 3600))
+_sentinel_cache = TTLCache(maxsize=512, ttl=SENTINEL_CACHE_TTL) if TTLCache else None
+_sentinel_cache_lock = threading.Lock()
+
+
+def _sentinel_cache_key(latitude, longitude, start_date, end_date, bands=('B04', 'B08')):
+    return (round(latitude, 4), round(longitude, 4), start_date.date(), end_date.date(), tuple(bands))
+
+
+def fetch_sentinel(latitude, longitude, start_date, end_date, bands=('B04', 'B08')):
+    """downloader.download_sentinel_data through the process-wide download cache"""
+    key = _sentinel_cache_key(latitude, longitude, start_date, end_date, bands)
+    if _sentinel_cache is not None:
+        with _sentinel_cache_lock:
+            cached = _sentinel_cache.get(key)
+        if cached is not None:
+            logger.info("⚡ Reusing cached Sentinel-2 download")
+            return cached
+
+    sentinel_data = downloader.download_sentinel_data(
+        latitude=latitude,
+        longitude=longitude,
+        start_date=start_date,
+        end_date=end_date,
+        bands=list(bands)
+    )
+
+    # Failures are not cached, so the next request retries
+    if _sentinel_cache is not None and sentinel_data and sentinel_data.get('status') == 'success':
+        with _sentinel_cache_lock:
+            _sentinel_cache[key] = sentinel_data
+    return sentinel_data
+
+
+def fetch_sentinel_series(latitude, longitude, dates, window_days=3):
+    """
+    Sentinel-2 data for each date's +/- window_days window, aligned with dates (None: no real data).
+    Cached windows are reused; the rest come from one downloader.download_sentinel_timeseries call.
+    """
+    window = timedelta(days=window_days)
+    keys = [_sentinel_cache_key(latitude, longitude, d - window, d + window) for d in dates]
+    results = [None] * len(dates)
+    if _sentinel_cache is not None:
+        with _sentinel_cache_lock:
+            results = [_sentinel_cache.get(key) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        fetched = downloader.download_sentinel_timeseries(
+            latitude, longitude, [dates[i] for i in missing], window_days=window_days)
+        for i, sentinel_data in zip(missing, fetched):
+            if sentinel_data and sentinel_data.get('status') == 'success':
+                results[i] = sentinel_data
+                if _sentinel_cache is not None:
+                    with _sentinel_cache_lock:
+                        _sentinel_cache[keys[i]] = sentinel_data
+    return results
+
+# Health and env-check payloads only depend on settings read at startup: serialize them
+# once; the health check just splices in the current timestamp
+_HEALTH_PREFIX = app.json.dumps({
+    'status': 'healthy',
+    'service': 'NDVI Analysis API',
+    'copernicus_configured': downloader.username is not None,
+    'force_simulated': downloader.force_simulated
+})[:-1]
+
+_ENV_CHECK_BODY = app.json.dumps({'environment_variables': {
+    'COPERNICUS_USERNAME': bool(os.getenv('COPERNICUS_USERNAME')),
+    'COPERNICUS_PASSWORD': bool(os.getenv('COPERNICUS_PASSWORD')),
+    'COPERNICUS_CLIENT_ID': bool(os.getenv('COPERNICUS_CLIENT_ID')),
+    'COPERNICUS_CLIENT_SECRET': bool(os.getenv('COPERNICUS_CLIENT_SECRET')),
+    'NDVI_FORCE_SIMULATED': bool(os.getenv('NDVI_FORCE_SIMULATED')),
+    'NDVI_PORT': os.getenv('NDVI_PORT', 'Not Set')
+}})
+
+# ==================== Request validation ====================
+
+if msgspec is not None:
+    Latitude = Annotated[float, msgspec.Meta(ge=-90, le=90)]
+    Longitude = Annotated[float, msgspec.Meta(ge=-180, le=180)]
+
+    class AnalyzeIn(msgspec.Struct):
+        """Request body of /api/ndvi/analyze"""
+        latitude: Latitude
+        longitude: Longitude
+        date: Optional[str] = None
+        run_async: bool = msgspec.field(default=False, name='async')
+
+    class TimeseriesIn(msgspec.Struct):
+        """Request body of /api/ndvi/timeseries"""
+        latitude: Latitude
+        longitude: Longitude
+        start_date: str
+        end_date: str
+
+    # strict=False keeps float() semantics for numeric strings such as "30.34"
+    _analyze_decoder = msgspec.json.Decoder(AnalyzeIn, strict=False)
+    _timeseries_decoder = msgspec.json.Decoder(TimeseriesIn, strict=False)
+else:
+    _analyze_decoder = _timeseries_decoder = None
+
+
+def decode_body(decoder):
+    """Parse and validate the request body in one pass (None: use the manual checks)"""
+    if decoder is None:
+        return None
+    try:
+        return decoder.decode(request.get_data())
+    except msgspec.MsgspecError:
+        return None
+
+
+def parse_coordinates(latitude, longitude):
+    """(latitude, longitude, None) as floats, or (None, None, error message)"""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None, None, 'Latitude and longitude must be numbers'
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None, 'Latitude must be within [-90, 90] and longitude within [-180, 180]'
+    return latitude, longitude, None
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str):
+    """datetime for a YYYY-MM-DD string (raises ValueError); clients repeat the same few dates"""
+    return datetime.strptime(date_str, '%Y-%m-%d')
+
+
+def parse_target_date(date_str):
+    """(target datetime, None) for a YYYY-MM-DD string (a week ago if empty), or (None, error)"""
+    if not date_str:
+        return g.now - timedelta(days=7), None
+    try:
+        return parse_date(date_str), None
+    except (TypeError, ValueError):
+        return None, 'Invalid date format. Use YYYY-MM-DD'
+
+
+@app.before_request
+def _stamp_request():
+    """Read the clock and format the response timestamp once per request"""
+    g.now = datetime.now()
+    g.ts = g.now.isoformat()
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'NDVI Analysis API',
-        'timestamp': datetime.now().isoformat(),
-        'copernicus_configured': downloader.username is not None,
-        'force_simulated': downloader.force_simulated
-    })
+    body = f'{_HEALTH_PREFIX}, "timestamp": "{g.ts}"}}'
+    return Response(body, status=200, mimetype='application/json')
+
+def _safe_float(value):
+    """float(value), or None when the value is missing or not numeric"""
+    if isinstance(value, (float, int, np.number)):
+        return float(value)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def run_ndvi_analysis(latitude, longitude, target_date, cache_key=None, array_format='json'):
+    """
+    Analyze NDVI for given coordinates and return the serialized JSON response.
+    PRIORITY: Try Copernicus first, fallback to synthetic only if fails
+    """
+    # STEP 1: Try REAL Copernicus data first
+    real_data_success = False
+    ndvi_data = None
+    data_source = "unknown"
+
+    if downloader.real_data_enabled:
+        logger.info("🛰️  Attempting to fetch REAL Copernicus Sentinel-2 data...")
+        try:
+            sentinel_data = fetch_sentinel(
+                latitude,
+                longitude,
+                start_date=target_date - timedelta(days=15),
+                end_date=target_date,
+                bands=('B04', 'B08')  # Red and NIR bands
+            )
+
+            if sentinel_data and 'status' in sentinel_data and sentinel_data['status'] == 'success':
+                logger.info("✅ Successfully downloaded REAL Copernicus data!")
+
+                # Calculate NDVI from real bands
+                red_band = sentinel_data.get('red_band')
+                nir_band = sentinel_data.get('nir_band')
+
+                if red_band is not None and nir_band is not None:
+                    # Calculate NDVI
+                    ndvi_value = calculator.calculate_ndvi_from_bands(red_band, nir_band)
+
+                    health = calculator.classify_vegetation_health(ndvi_value) if ndvi_value is not None else {}
+
+                    ndvi_data = {
+                        'ndvi': _safe_float(ndvi_value),
+                        'red_band': _safe_float(red_band),
+                        'nir_band': _safe_float(nir_band),
+                        'health_category': health.get('category'),
+                        'health_score': health.get('health_score'),
+                        'description': f'Real satellite data from Copernicus Sentinel-2',
+                        'acquisition_date': sentinel_data.get('acquisition_date', target_date.isoformat()),
+                        'cloud_coverage': sentinel_data.get('cloud_coverage', 0)
+                    }
+
+                    real_data_success = True
+                    data_source = "copernicus_real"
+                    logger.info(f"🎯 Real NDVI calculated: {ndvi_value:.3f}")
+                else:
+                    logger.warning("⚠️  Copernicus returned success but bands are missing")
+            else:
+                logger.warning("⚠️  Copernicus data download failed or returned no data")
+
+        except Exception as e:
+            logger.error(f"❌ Error fetching Copernicus data: {e}")
+            real_data_success = False
+    # Otherwise real data is disabled for the process (the downloader logged why at startup)
+
+    # STEP 2: Fallback to synthetic/modeled data if real data failed
+    if not real_data_success:
+        logger.info("📊 Falling back to synthetic/modeled NDVI data...")
+
+        ndvi_data = calculator.calculate_ndvi(
+            latitude=latitude,
+            longitude=longitude,
+            acquisition_date=target_date
+        )
+
+        data_source = "synthetic_modeled"
+        logger.warning("⚠️  Using SYNTHETIC data - not real satellite imagery!")
+
+        if array_format == 'float16' and isinstance(ndvi_data, dict):
+            encode_ndvi_array(ndvi_data)
+
+        # orjson encodes the contiguous ndarray directly (float32 digits, no 250k Python floats);
+        # the stdlib encoder needs it converted to nested lists first
+        elif (orjson is None and isinstance(ndvi_data, dict)
+                and ndvi_data.get('ndvi_array') is not None):
+            try:
+                ndvi_data['ndvi_array'] = ndvi_data['ndvi_array'].tolist()
+            except AttributeError:
+                # ndvi_array is not a numpy array (already serializable) — leave as is
+                pass
+
+    # Build response
+    response = {
+        'status': 'success',
+        'data': ndvi_data,
+        'metadata': {
+            'latitude': latitude,
+            'longitude': longitude,
+            'date': target_date.isoformat(),
+            'data_source': data_source,
+            'is_real_data': real_data_success,
+            # Not g.ts: async and batch jobs run this outside the request context
+            'timestamp': datetime.now().isoformat()
+        }
+    }
+
+    # Serialize once; the synthetic payload carries the full NDVI array
+    body = app.json.dumps(response)
+    if cache_key is not None and not real_data_success:
+        with _analyze_cache_lock:
+            cache_put(_analyze_cache, cache_key, body)
+            _analyze_gzip_cache.pop(cache_key, None)
+
+    return body
+
+
+def encode_ndvi_array(ndvi_data):
+    """Replace ndvi_data['ndvi_array'] with base64 little-endian float16 bytes plus dtype/shape"""
+    ndvi_array = ndvi_data.get('ndvi_array')
+    if not isinstance(ndvi_array, np.ndarray):
+        return
+    ndvi_data['ndvi_array'] = base64.b64encode(ndvi_array.astype('<f2').tobytes()).decode('ascii')
+    ndvi_data['ndvi_array_dtype'] = 'float16'
+    ndvi_data['ndvi_array_shape'] = list(ndvi_array.shape)
+
+
+def analysis_cache_key(latitude, longitude, target_date, array_format='json'):
+    """_analyze_cache key for a request (None when caching is unavailable)"""
+    if _analyze_cache is None:
+        return None
+    return (round(latitude, 4), round(longitude, 4), target_date.date(), array_format)
+
+
+def get_cached_analysis(cache_key):
+    """Serialized analyze response for cache_key, or None"""
+    if cache_key is None:
+        return None
+    with _analyze_cache_lock:
+        return _analyze_cache.get(cache_key)
+
+
+def accepts_gzip():
+    """Whether the current client accepts gzip-encoded responses"""
+    return 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def gzip_json_response(compressed, status=200):
+    """JSON response for an already gzipped body"""
+    response = Response(compressed, status=status, mimetype='application/json')
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def get_cached_analysis_gzip(cache_key, body):
+    """gzip of a cached analyze body, compressed once per cache entry"""
+    with _analyze_cache_lock:
+        compressed = _analyze_gzip_cache.get(cache_key)
+    if compressed is None:
+        compressed = gzip.compress(body.encode(), compresslevel=COMPRESS_LEVEL, mtime=0)
+        with _analyze_cache_lock:
+            cache_put(_analyze_gzip_cache, cache_key, compressed)
+    return compressed
+
+
+@app.after_request
+def compress_response(response):
+    """gzip large JSON responses for clients that accept it"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not accepts_gzip():
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+# Encodings of the synthetic ndvi_array in analyze responses (?array_format=)
+NDVI_ARRAY_FORMATS = ('json', 'float16')
+
 
 @app.route('/api/ndvi/analyze', methods=['POST'])
 def analyze_ndvi():
     """
     Analyze NDVI for given coordinates
     PRIORITY: Try Copernicus first, fallback to synthetic only if fails
+
+    Query parameters:
+        array_format: 'json' (default, nested lists) or 'float16' (the synthetic
+                      ndvi_array as base64 little-endian float16 bytes, with
+                      ndvi_array_dtype and ndvi_array_shape alongside)
     """
     try:
-        data = request.get_json()
+        array_format = request.args.get('array_format', 'json')
+        if array_format not in NDVI_ARRAY_FORMATS:
+            return jsonify({'error': f"array_format must be one of {', '.join(NDVI_ARRAY_FORMATS)}"}), 400
 
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        # Fast path: well-formed bodies are decoded and validated by msgspec.
+        # Anything it rejects goes through the manual checks below for the error message.
+        req = decode_body(_analyze_decoder)
 
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
-        date_str = data.get('date')
+        if req is not None:
+            latitude, longitude, date_str, run_async = req.latitude, req.longitude, req.date, req.run_async
+        else:
+            data = request.get_json(silent=True)
 
-        if latitude is None or longitude is None:
-            return jsonify({'error': 'Latitude and longitude are required'}), 400
+            if not data or not isinstance(data, dict):
+                return jsonify({'error': 'No data provided'}), 400
 
-        # Parse date
-        if date_str:
-            try:
-                target_date = datetime.strptime(date_str, '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
-        else:
-            target_date = datetime.now() - timedelta(days=7)
+            if data.get('latitude') is None or data.get('longitude') is None:
+                return jsonify({'error': 'Latitude and longitude are required'}), 400
+
+            latitude, longitude, error = parse_coordinates(data['latitude'], data['longitude'])
+            if error:
+                return jsonify({'error': error}), 400
+            date_str = data.get('date')
+            run_async = bool(data.get('async'))
+
+        target_date, error = parse_target_date(date_str)
+        if error:
+            return jsonify({'error': error}), 400
 
         logger.info(f"📍 NDVI Analysis Request: lat={latitude}, lon={longitude}, date={target_date.date()}")
 
-        # STEP 1: Try REAL Copernicus data first
-        real_data_success = False
-        ndvi_data = None
-        data_source = "unknown"
+        cache_key = analysis_cache_key(latitude, longitude, target_date, array_format)
+        cached = get_cached_analysis(cache_key)
+        if cached is not None:
+            logger.info("⚡ Serving cached NDVI analysis")
+            if accepts_gzip():
+                return gzip_json_response(get_cached_analysis_gzip(cache_key, cached))
+            return Response(cached, status=200, mimetype='application/json')
+
+        if run_async and downloader.real_data_enabled:
+            # Real Copernicus downloads can take minutes: run in the background, client polls
+            job_id = uuid.uuid4().hex
+            remove_expired_files(JOB_DIR, JOB_TTL)
+            write_file_atomic(job_file(job_id, 'running'), b'')
+            _job_executor.submit(run_ndvi_job, job_id, latitude, longitude, target_date, cache_key, array_format)
+            logger.info(f"🧵 NDVI analysis job {job_id} submitted")
+            return jsonify({
+                'status': 'accepted',
+                'job_id': job_id,
+                'poll_url': f"/api/ndvi/jobs/{job_id}"
+            }), 202
+
+        body = run_ndvi_analysis(latitude, longitude, target_date, cache_key, array_format)
+        return Response(body, status=200, mimetype='application/json')
 
-        if not downloader.force_simulated and downloader.username:
-            logger.info("🛰️  Attempting to fetch REAL Copernicus Sentinel-2 data...")
-            try:
-                sentinel_data = downloader.download_sentinel_data(
-                    latitude=latitude,
-                    longitude=longitude,
-                    start_date=target_date - timedelta(days=15),
-                    end_date=target_date,
-                    bands=['B04', 'B08']  # Red and NIR bands
-                )
-
-                if sentinel_data and 'status' in sentinel_data and sentinel_data['status'] == 'success':
-                    logger.info("✅ Successfully downloaded REAL Copernicus data!")
-
-                    # Calculate NDVI from real bands
-                    red_band = sentinel_data.get('red_band')
-                    nir_band = sentinel_data.get('nir_band')
-
-                    if red_band is not None and nir_band is not None:
-                        # Calculate NDVI
-                        ndvi_value = calculator.calculate_ndvi_from_bands(red_band, nir_band)
-
-                        # Safely convert to float only if values are not None
-                        ndvi_float = None
-                        try:
-                            if ndvi_value is not None:
-                                ndvi_float = float(ndvi_value)
-                        except (TypeError, ValueError):
-                            ndvi_float = None
-
-                        red_float = None
-                        try:
-                            if red_band is not None:
-                                red_float = float(red_band)
-                        except (TypeError, ValueError):
-                            red_float = None
-
-                        nir_float = None
-                        try:
-                            if nir_band is not None:
-                                nir_float = float(nir_band)
-                        except (TypeError, ValueError):
-                            nir_float = None
-
-                        ndvi_data = {
-                            'ndvi': ndvi_float,
-                            'red_band': red_float,
-                            'nir_band': nir_float,
-                            'health_category': calculator.get_health_category(ndvi_value) if ndvi_value is not None else None,
-                            'health_score': calculator.get_health_score(ndvi_value) if ndvi_value is not None else None,
-                            'description': f'Real satellite data from Copernicus Sentinel-2',
-                            'acquisition_date': sentinel_data.get('acquisition_date', target_date.isoformat()),
-                            'cloud_coverage': sentinel_data.get('cloud_coverage', 0)
-                        }
-
-                        real_data_success = True
-                        data_source = "copernicus_real"
-                        logger.info(f"🎯 Real NDVI calculated: {ndvi_value:.3f}")
-                    else:
-                        logger.warning("⚠️  Copernicus returned success but bands are missing")
-                else:
-                    logger.warning("⚠️  Copernicus data download failed or returned no data")
+    except Exception as e:
+        logger.error(f"Error in NDVI analysis: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+            'timestamp': g.ts
+        }), 500
 
-            except Exception as e:
-                logger.error(f"❌ Error fetching Copernicus data: {e}")
-                real_data_success = False
-        else:
-            if downloader.force_simulated:
-                logger.info("⚙️  NDVI_FORCE_SIMULATED is enabled - skipping real data")
-            else:
-                logger.warning("⚠️  No Copernicus credentials configured - cannot fetch real data")
+# Upper bound on points per /api/ndvi/analyze/batch request
+MAX_BATCH_POINTS = 100
 
-        # STEP 2: Fallback to synthetic/modeled data if real data failed
-        if not real_data_success:
-            logger.info("📊 Falling back to synthetic/modeled NDVI data...")
 
-            ndvi_data = calculator.calculate_ndvi(
-                latitude=latitude,
-                longitude=longitude,
-                acquisition_date=target_date
-            )
+def _prepare_batch_point(point):
+    """(latitude, longitude, target_date, cache_key) for one batch point, or an error message"""
+    if not isinstance(point, dict):
+        return 'Each point must be a JSON object'
+    if point.get('latitude') is None or point.get('longitude') is None:
+        return 'Latitude and longitude are required'
 
-            data_source = "synthetic_modeled"
-            logger.warning("⚠️  Using SYNTHETIC data - not real satellite imagery!")
+    latitude, longitude, error = parse_coordinates(point['latitude'], point['longitude'])
+    if error:
+        return error
+    target_date, error = parse_target_date(point.get('date'))
+    if error:
+        return error
+    return latitude, longitude, target_date, analysis_cache_key(latitude, longitude, target_date)
 
-            # Convert any numpy ndarrays to lists for JSON serialization
-            if isinstance(ndvi_data, dict) and ndvi_data.get('ndvi_array') is not None:
-                try:
-                    ndvi_data['ndvi_array'] = ndvi_data['ndvi_array'].tolist()
-                except AttributeError:
-                    # ndvi_array is not a numpy array (already serializable) — leave as is
-                    pass
 
-        # Build response
-        response = {
-            'status': 'success',
-            'data': ndvi_data,
-            'metadata': {
-                'latitude': latitude,
-                'longitude': longitude,
-                'date': target_date.isoformat(),
-                'data_source': data_source,
-                'is_real_data': real_data_success,
-                'timestamp': datetime.now().isoformat()
-            }
-        }
+@app.route('/api/ndvi/analyze/batch', methods=['POST'])
+def analyze_ndvi_batch():
+    """
+    Analyze NDVI for several coordinates in one request
+
+    Request Body:
+    {
+        "points": [
+            {"latitude": 30.3398, "longitude": 76.3869, "date": "2024-05-20"},
+            ...
+        ]
+    }
 
-        return jsonify(response), 200
+    Returns {"status": "success", "results": [...]} in input order; each entry is the
+    /api/ndvi/analyze response for that point (or its own error)
+    """
+    try:
+        data = request.get_json(silent=True)
+        points = data.get('points') if isinstance(data, dict) else None
+
+        if not isinstance(points, list):
+            return jsonify({'error': 'Request body must contain a "points" list'}), 400
+
+        if len(points) > MAX_BATCH_POINTS:
+            return jsonify({'error': f'Too many points (max {MAX_BATCH_POINTS})'}), 400
+
+        logger.info(f"📍 NDVI batch analysis request: {len(points)} points")
+
+        # Entries are already-serialized JSON: cached bodies are spliced in as-is
+        bodies = [None] * len(points)
+        pending = {}
+        for i, point in enumerate(points):
+            prepared = _prepare_batch_point(point)
+            if isinstance(prepared, str):
+                bodies[i] = app.json.dumps({'status': 'error', 'error': prepared})
+                continue
+
+            bodies[i] = get_cached_analysis(prepared[3])
+            if bodies[i] is not None:
+                continue
+            if downloader.real_data_enabled:
+                # Copernicus downloads are network-bound: fetch the points concurrently
+                pending[i] = _job_executor.submit(run_ndvi_analysis, *prepared)
+            else:
+                bodies[i] = run_ndvi_analysis(*prepared)
+
+        for i, future in pending.items():
+            try:
+                bodies[i] = future.result()
+            except Exception as e:
+                logger.error(f"Error in batch NDVI analysis: {e}")
+                bodies[i] = app.json.dumps({'status': 'error', 'error': str(e)})
+
+        body = f'{{"status": "success", "results": [{", ".join(bodies)}]}}'
+        return Response(body, status=200, mimetype='application/json')
 
     except Exception as e:
-        logger.error(f"Error in NDVI analysis: {e}")
+        logger.error(f"Error in batch NDVI analysis: {e}")
         return jsonify({
             'status': 'error',
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g.ts
         }), 500
 
+def job_file(job_id, state):
+    """Path of a job's state file: 'running', 'json' (finished body) or 'error' (message)"""
+    return os.path.join(JOB_DIR, f"{job_id}.{state}")
+
+
+def run_ndvi_job(job_id, latitude, longitude, target_date, cache_key, array_format):
+    """run_ndvi_analysis in the background, recording the outcome in the job's state files"""
+    try:
+        # JOB_TIMEOUT counts from here, not from submission: a job may queue for a worker
+        os.utime(job_file(job_id, 'running'))
+    except OSError:
+        pass
+    try:
+        body = run_ndvi_analysis(latitude, longitude, target_date, cache_key, array_format)
+        write_file_atomic(job_file(job_id, 'json'), body.encode())
+    except Exception as e:
+        logger.error(f"Error in NDVI analysis job {job_id}: {e}")
+        write_file_atomic(job_file(job_id, 'error'), str(e).encode())
+    finally:
+        try:
+            os.remove(job_file(job_id, 'running'))
+        except OSError:
+            pass
+
+
+# Job ids are uuid4 hex strings; anything else never names a job file
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+@app.route('/api/ndvi/jobs/<job_id>', methods=['GET'])
+def get_ndvi_job(job_id):
+    """Poll a background NDVI analysis submitted with {"async": true}"""
+    if _JOB_ID_RE.match(job_id):
+        cutoff = time.time() - JOB_TTL
+        # 'running' first: a finishing job writes its result before removing it
+        for state in ('running', 'json', 'error'):
+            path = job_file(job_id, state)
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime < cutoff:
+                    continue
+                if state == 'running':
+                    if time.time() - mtime < JOB_TIMEOUT:
+                        return jsonify({'status': 'running', 'job_id': job_id}), 202
+                    return jsonify({
+                        'status': 'error',
+                        'error': f'Job did not finish within {JOB_TIMEOUT} seconds',
+                        'timestamp': g.ts
+                    }), 500
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+            except OSError:
+                continue  # Not in this state (or finished between the check and the read)
+
+            if state == 'error':
+                return jsonify({
+                    'status': 'error',
+                    'error': data.decode(errors='replace'),
+                    'timestamp': g.ts
+                }), 500
+            return Response(data, status=200, mimetype='application/json')
+
+    return jsonify({'status': 'error', 'error': 'Unknown or expired job'}), 404
+
+def synthetic_point_ndvi(latitude, longitude, target_date):
+    """Mean NDVI of the synthetic model for one location, 0.5 if it cannot be computed"""
+    synthetic = calculator.calculate_ndvi(latitude, longitude, target_date)
+    # synthetic may be None or not a dict; handle robustly
+    if isinstance(synthetic, dict):
+        stats = synthetic.get('statistics')
+        mean = stats.get('mean') if isinstance(stats, dict) else None
+        return round(mean, 3) if mean is not None else 0.5
+    # Explicitly handle None before converting to float to satisfy type checkers
+    if synthetic is None:
+        return 0.5
+    try:
+        # if synthetic is a numeric value
+        return float(synthetic)
+    except (TypeError, ValueError):
+        return 0.5
+
 @app.route('/api/ndvi/timeseries', methods=['POST'])
 def get_ndvi_timeseries():
     """Get NDVI time series data"""
     try:
-        data = request.get_json()
+        req = decode_body(_timeseries_decoder)
 
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
-        start_date_str = data.get('start_date')
-        end_date_str = data.get('end_date')
+        if req is not None:
+            latitude, longitude = req.latitude, req.longitude
+            start_date_str, end_date_str = req.start_date, req.end_date
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                data = {}
 
-        if not all([latitude, longitude, start_date_str, end_date_str]):
-            return jsonify({'error': 'Missing required parameters'}), 400
+            start_date_str = data.get('start_date')
+            end_date_str = data.get('end_date')
 
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+            if data.get('latitude') is None or data.get('longitude') is None or not start_date_str or not end_date_str:
+                return jsonify({'error': 'Missing required parameters'}), 400
+
+            latitude, longitude, error = parse_coordinates(data['latitude'], data['longitude'])
+            if error:
+                return jsonify({'error': error}), 400
+
+        try:
+            start_date = parse_date(start_date_str)
+            end_date = parse_date(end_date_str)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
         logger.info(f"📈 Time series request: {start_date.date()} to {end_date.date()}")
 
-        # Generate time series (attempt real data for each point)
-        timeseries = []
-        current_date = start_date
+        # Weekly points from start_date through end_date
+        weeks = (end_date - start_date).days // 7 + 1 if end_date >= start_date else 0
+        dates = [start_date + timedelta(days=7 * i) for i in range(weeks)]
+        # ISO strings for all points in one pass (same 'YYYY-MM-DDTHH:MM:SS' as isoformat())
+        iso_dates = (np.datetime64(start_date, 's') + np.arange(weeks) * np.timedelta64(7, 'D')).astype(str).tolist()
 
-        while current_date <= end_date:
-            # Try real data first
-            point_data = {
-                'date': current_date.isoformat(),
-                'ndvi': None,
-                'source': 'none'
-            }
+        # Real data for all points: one catalogue search instead of one per point
+        ndvi = np.full(len(dates), np.nan)
+        if downloader.real_data_enabled and dates:
+            try:
+                series = fetch_sentinel_series(latitude, longitude, dates)
+                red = np.array([d.get('red_band') if d else None for d in series], dtype=float)
+                nir = np.array([d.get('nir_band') if d else None for d in series], dtype=float)
+                # NDVI for every point at once; a missing band or zero denominator stays NaN
+                denom = nir + red
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    ndvi = np.where(denom != 0, (nir - red) / denom, np.nan)
+            except Exception as e:
+                logger.error(f"Error fetching Sentinel data in time series: {e}")
 
-            if not downloader.force_simulated and downloader.username:
-                try:
-                    sentinel_data = downloader.download_sentinel_data(
-                        latitude=latitude,
-                        longitude=longitude,
-                        start_date=current_date - timedelta(days=3),
-                        end_date=current_date + timedelta(days=3),
-                        bands=['B04', 'B08']
-                    )
-
-                    if sentinel_data and sentinel_data.get('status') == 'success':
-                        red = sentinel_data.get('red_band')
-                        nir = sentinel_data.get('nir_band')
-                        if red is not None and nir is not None:
-                            ndvi_val = calculator.calculate_ndvi_from_bands(red, nir)
-                            # Safely convert only when a numeric value is returned
-                            if ndvi_val is not None:
-                                try:
-                                    point_data['ndvi'] = float(ndvi_val)
-                                    point_data['source'] = 'copernicus_real'
-                                except (TypeError, ValueError):
-                                    logger.warning("Invalid NDVI value from bands; falling back to synthetic")
-                                    point_data['ndvi'] = None
-                                    point_data['source'] = 'none'
-                except Exception as e:
-                    logger.error(f"Error fetching Sentinel data in time series: {e}")
-
-            # Fallback to synthetic
-            if point_data['ndvi'] is None:
-                synthetic = calculator.calculate_ndvi(latitude, longitude, current_date)
-                # synthetic may be None or not a dict; handle robustly
-                if isinstance(synthetic, dict):
-                    point_data['ndvi'] = synthetic.get('ndvi', 0.5)
-                else:
-                    # Explicitly handle None before converting to float to satisfy type checkers
-                    if synthetic is None:
-                        point_data['ndvi'] = 0.5
-                    else:
-                        try:
-                            # if synthetic is a numeric value
-                            point_data['ndvi'] = float(synthetic)
-                        except (TypeError, ValueError):
-                            point_data['ndvi'] = 0.5
-                point_data['source'] = 'synthetic'
-
-            timeseries.append(point_data)
-            current_date += timedelta(days=7)  # Weekly intervals
+        # Fallback to synthetic: the model does not vary by date, so it is evaluated at most once
+        missing = np.isnan(ndvi)
+        synthetic_ndvi = synthetic_point_ndvi(latitude, longitude, dates[0]) if missing.any() else None
+
+        timeseries = [
+            {'date': date, 'ndvi': synthetic_ndvi, 'source': 'synthetic'} if is_missing
+            else {'date': date, 'ndvi': value, 'source': 'copernicus_real'}
+            for date, value, is_missing in zip(iso_dates, ndvi.tolist(), missing.tolist())
+        ]
 
         return jsonify({
             'status': 'success',
@@ -318,22 +913,66 @@ def get_ndvi_timeseries():
         logger.error(f"Error in time series: {e}")
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
+@app.route('/api/ndvi/visualization/<lat>/<lng>', methods=['GET'])
+def get_ndvi_visualization(lat, lng):
+    """NDVI report PNG for given coordinates, served from the on-disk cache when fresh"""
+    latitude, longitude, error = parse_coordinates(lat, lng)
+    if error:
+        return jsonify({'error': error}), 400
+
+    # The report only depends on the synthetic sample, which is shared by every
+    # location with the same pattern
+    key = hashlib.sha1(repr(sample_pattern_key(latitude, longitude)).encode()).hexdigest()
+    path = os.path.join(VIZ_CACHE_DIR, key + '.png')
+
+    try:
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < VIZ_CACHE_TTL:
+            # A path (not a buffer) lets gunicorn hand the file to sendfile(2); conditional
+            # requests with a matching ETag/Last-Modified get a bodiless 304
+            return send_file(path, mimetype='image/png', conditional=True, etag=True, max_age=VIZ_CACHE_TTL)
+
+        logger.info(f"🖼️  Rendering NDVI visualization for {latitude}, {longitude}")
+        try:
+            png = render_visualization(latitude, longitude)
+        except FutureTimeoutError:
+            logger.error(f"NDVI visualization for {latitude}, {longitude} timed out")
+            return jsonify({
+                'status': 'error',
+                'error': f'Visualization rendering timed out after {VIZ_RENDER_TIMEOUT} seconds'
+            }), 504
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 500
+
+        # Drop expired renders (including ones left by older cache keys), then write
+        # next to the target and rename, so readers never see a partial PNG
+        remove_expired_files(VIZ_CACHE_DIR, VIZ_CACHE_TTL)
+        write_file_atomic(path, png)
+
+        # This response is served from memory; only later hits read the cache file
+        return send_file(io.BytesIO(png), mimetype='image/png', max_age=VIZ_CACHE_TTL)
+
+    except Exception as e:
+        logger.error(f"Error in NDVI visualization: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
 # Optional endpoint for environment credential check (for debugging)
 @app.route('/api/env_check', methods=['GET'])
 def env_check():
-    creds = {
-        'COPERNICUS_USERNAME': bool(os.getenv('COPERNICUS_USERNAME')),
-        'COPERNICUS_PASSWORD': bool(os.getenv('COPERNICUS_PASSWORD')),
-        'COPERNICUS_CLIENT_ID': bool(os.getenv('COPERNICUS_CLIENT_ID')),
-        'COPERNICUS_CLIENT_SECRET': bool(os.getenv('COPERNICUS_CLIENT_SECRET')),
-        'NDVI_FORCE_SIMULATED': bool(os.getenv('NDVI_FORCE_SIMULATED')),
-        'NDVI_PORT': os.getenv('NDVI_PORT', 'Not Set')
-    }
-    return jsonify({'environment_variables': creds}), 200
+    return Response(_ENV_CHECK_BODY, status=200, mimetype='application/json')
 
 if __name__ == '__main__':
     port = int(os.getenv('NDVI_PORT', 5001))
     logger.info(f"🚀 Starting NDVI Analysis API on port {port}")
     logger.info(f"📡 Copernicus configured: {downloader.username is not None}")
     logger.info(f"⚙️  Force simulated: {downloader.force_simulated}")
-    app.run(host='0.0.0.0', port=port, debug=True)
+
+    if os.getenv('FLASK_DEV'):
+        # Development: Werkzeug server with debugger and reloader
+        app.run(host='0.0.0.0', port=port, debug=True, threaded=True)
+    elif shutil.which('gunicorn'):
+        # Production: gunicorn with gthread workers, settings in gunicorn_conf.py
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        os.execvp('gunicorn', ['gunicorn', '-c', 'gunicorn_conf.py', 'ndvi_flask_backend:app'])
+    else:
+        logger.warning("⚠️  gunicorn not available; serving with the Flask server (debug off)")
+        app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
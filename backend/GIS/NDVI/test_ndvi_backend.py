@@ -0,0 +1,325 @@
+import base64
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from ndvi_calculator import NDVICalculator, sample_pattern_key
+
+NDVI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory):
+    """ndvi_flask_backend in simulated mode, with job/visualization files under a temp dir"""
+    tmp = tmp_path_factory.mktemp('ndvi')
+    # The settings are read at import; restore the environment for the rest of the session
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('NDVI_FORCE_SIMULATED', '1')
+        mp.setenv('NDVI_JOB_DIR', str(tmp / 'jobs'))
+        mp.setenv('NDVI_VIZ_CACHE_DIR', str(tmp / 'viz'))
+        mp.setenv('NDVI_VIZ_PROCESSES', '0')
+        import ndvi_flask_backend
+        yield ndvi_flask_backend
+
+
+@pytest.fixture
+def client(backend):
+    with backend._analyze_cache_lock:
+        backend._analyze_cache.clear()
+        backend._analyze_gzip_cache.clear()
+    if backend._sentinel_cache is not None:
+        with backend._sentinel_cache_lock:
+            backend._sentinel_cache.clear()
+    for name in os.listdir(backend.VIZ_CACHE_DIR):
+        os.remove(os.path.join(backend.VIZ_CACHE_DIR, name))
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def real_data(backend, monkeypatch):
+    """Pretend Copernicus is configured, with a download that returns fixed bands"""
+    monkeypatch.setattr(backend.downloader, 'real_data_enabled', True)
+    monkeypatch.setattr(backend, 'fetch_sentinel', lambda *args, **kwargs: {
+        'status': 'success', 'red_band': 0.1, 'nir_band': 0.3,
+        'acquisition_date': '2024-05-01', 'cloud_coverage': 3
+    })
+
+
+# ==================== Calculator ====================
+
+def test_calculate_indices():
+    calculator = NDVICalculator()
+    red = np.array([0.1, 0.0, 0.2])
+    nir = np.array([0.3, 0.0, 0.2])
+    green = np.array([0.5, 0.1, 0.2])
+
+    indices = calculator.calculate_indices(red, nir, green_band=green)
+    assert set(indices) == {'ndvi', 'ndwi'}
+    assert indices['ndvi'].dtype == np.float32
+    np.testing.assert_allclose(indices['ndvi'][[0, 2]], [0.5, 0.0], atol=1e-6)
+    assert np.isnan(indices['ndvi'][1])  # NIR + Red == 0
+    np.testing.assert_allclose(indices['ndwi'], [0.25, 1.0, 0.0], atol=1e-6)
+
+    batch = calculator.calculate_ndvi_batch(red.reshape(3, 1), nir.reshape(3, 1))
+    assert batch.shape == (3, 1)
+    np.testing.assert_array_equal(batch.ravel(), indices['ndvi'])
+
+
+def test_health_categories_match_scalar_getters():
+    calculator = NDVICalculator()
+    values = np.array([np.nan, -0.5, 0.0, 0.1999, 0.2, 0.4, 0.6, 0.9])
+
+    assert calculator.get_health_categories(values).tolist() == [calculator.get_health_category(v) for v in values]
+    assert calculator.get_health_scores(values).tolist() == [calculator.get_health_score(v) for v in values]
+    assert calculator.get_health_categories(np.zeros((2, 3))).shape == (2, 3)
+    assert calculator.get_health_category(None) == 'Unknown'
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("value, expected", [
+    (0.1, 'sparse_vegetation'),
+    (0.3, 'moderate_vegetation'),
+    (0.6, 'dense_vegetation'),
+    (0.0999, 'water_bare_soil'),
+])
+def test_coverage_class_bounds(dtype, value, expected):
+    stats = NDVICalculator().calculate_ndvi_statistics(np.full(10, value, dtype=dtype))
+    assert stats['vegetation_coverage'][expected] == 100.0
+
+
+def test_calculator_loads_by_file_path():
+    # Soil and backend/ndvi load ndvi_calculator by path; a later plain import must still work
+    load_by_path = (
+        "import importlib.util\n"
+        "spec = importlib.util.spec_from_file_location('ndvi_calculator', 'ndvi_calculator.py')\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        "assert module.NDVICalculator().calculate_ndvi(30.3, 76.3)['statistics']['mean'] > 0\n"
+    )
+    plain_import = (
+        "import ndvi_calculator\n"
+        "assert ndvi_calculator.NDVICalculator().calculate_ndvi(30.3, 76.3)['statistics']['mean'] > 0\n"
+    )
+    for code in (load_by_path, plain_import, load_by_path):
+        result = subprocess.run([sys.executable, '-c', code], cwd=NDVI_DIR, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+
+# ==================== Analyze ====================
+
+def test_analyze_synthetic(client):
+    resp = client.post('/api/ndvi/analyze', json={'latitude': 30.3398, 'longitude': 76.3869, 'date': '2024-05-20'})
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data['metadata']['data_source'] == 'synthetic_modeled'
+    assert np.asarray(data['data']['ndvi_array']).shape == (500, 500)
+
+
+def test_analyze_real_data(client, real_data):
+    resp = client.post('/api/ndvi/analyze', json={'latitude': 30.3398, 'longitude': 76.3869, 'date': '2024-05-20'})
+    assert resp.status_code == 200
+    data = resp.get_json()['data']
+    assert data['ndvi'] == pytest.approx(0.5)
+    assert (data['health_category'], data['health_score']) == ('Good', 80)
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {"latitude": "invalid", "longitude": "invalid"},
+    {"latitude": 1000, "longitude": 1000, "date": "2024-05-20"},
+    {"latitude": 30.3, "longitude": 76.3, "date": "2024-5-xx"},
+])
+def test_analyze_invalid_inputs(client, payload):
+    assert client.post('/api/ndvi/analyze', json=payload).status_code == 400
+
+
+def test_analyze_float16_array(client):
+    payload = {'latitude': 30.3398, 'longitude': 76.3869, 'date': '2024-05-20'}
+    as_json = np.asarray(client.post('/api/ndvi/analyze', json=payload).get_json()['data']['ndvi_array'])
+
+    resp = client.post('/api/ndvi/analyze?array_format=float16', json=payload)
+    assert resp.status_code == 200
+    data = resp.get_json()['data']
+    assert data['ndvi_array_dtype'] == 'float16'
+    decoded = np.frombuffer(base64.b64decode(data['ndvi_array']), dtype='<f2').reshape(data['ndvi_array_shape'])
+    np.testing.assert_allclose(decoded, as_json, atol=1e-3)
+
+    resp = client.post('/api/ndvi/analyze?array_format=npy', json=payload)
+    assert resp.status_code == 400
+
+
+def test_analyze_gzip(client):
+    payload = {'latitude': 26.9, 'longitude': 75.8, 'date': '2024-05-20'}
+    plain = client.post('/api/ndvi/analyze', json=payload)
+    assert 'Content-Encoding' not in plain.headers
+
+    for _ in range(2):  # miss, then cache hit
+        resp = client.post('/api/ndvi/analyze', json=payload, headers={'Accept-Encoding': 'gzip'})
+        assert resp.status_code == 200
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(resp.data))['data'] == plain.get_json()['data']
+
+
+# ==================== Batch ====================
+
+def test_analyze_batch(client):
+    points = [
+        {'latitude': 30.3398, 'longitude': 76.3869, 'date': '2024-05-20'},
+        {'latitude': 'x', 'longitude': 76.3869},
+        {'latitude': 10.0, 'longitude': 75.0},
+    ]
+    resp = client.post('/api/ndvi/analyze/batch', json={'points': points})
+    assert resp.status_code == 200
+    results = resp.get_json()['results']
+    assert [r['status'] for r in results] == ['success', 'error', 'success']
+    assert results[0]['metadata']['latitude'] == 30.3398
+    assert results[2]['metadata']['latitude'] == 10.0
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {'points': 'not-a-list'},
+    {'points': [{'latitude': 1, 'longitude': 1}] * 101},
+])
+def test_analyze_batch_invalid(client, payload):
+    assert client.post('/api/ndvi/analyze/batch', json=payload).status_code == 400
+
+
+# ==================== Jobs ====================
+
+def test_async_job(client, real_data):
+    resp = client.post('/api/ndvi/analyze', json={'latitude': 30.3398, 'longitude': 76.3869, 'async': True})
+    assert resp.status_code == 202
+    poll_url = resp.get_json()['poll_url']
+
+    deadline = time.monotonic() + 10
+    while (resp := client.get(poll_url)).status_code == 202 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert resp.status_code == 200
+    assert resp.get_json()['data']['ndvi'] == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize("job_id", ['0' * 32, 'not-a-job-id'])
+def test_unknown_job(client, job_id):
+    resp = client.get(f'/api/ndvi/jobs/{job_id}')
+    assert resp.status_code == 404
+    assert resp.get_json()['error'] == 'Unknown or expired job'
+
+
+def test_stale_running_job(client, backend):
+    job_id = 'f' * 32
+    path = backend.job_file(job_id, 'running')
+    open(path, 'wb').close()
+    assert client.get(f'/api/ndvi/jobs/{job_id}').status_code == 202
+
+    stale = time.time() - backend.JOB_TIMEOUT - 1
+    os.utime(path, (stale, stale))
+    resp = client.get(f'/api/ndvi/jobs/{job_id}')
+    assert resp.status_code == 500
+    assert resp.get_json()['status'] == 'error'
+
+
+# ==================== Time series ====================
+
+def test_timeseries_synthetic(client):
+    resp = client.post('/api/ndvi/timeseries', json={
+        'latitude': 30.3398, 'longitude': 76.3869, 'start_date': '2024-05-01', 'end_date': '2024-05-20'
+    })
+    assert resp.status_code == 200
+    series = resp.get_json()['data']
+    assert [p['date'] for p in series] == ['2024-05-01T00:00:00', '2024-05-08T00:00:00', '2024-05-15T00:00:00']
+    # Synthetic points carry the model's mean NDVI for the location
+    mean = NDVICalculator().calculate_ndvi(30.3398, 76.3869)['statistics']['mean']
+    assert {(p['source'], p['ndvi']) for p in series} == {('synthetic', round(mean, 3))}
+
+
+def test_timeseries_mixes_real_and_synthetic(client, backend, monkeypatch):
+    monkeypatch.setattr(backend.downloader, 'real_data_enabled', True)
+    monkeypatch.setattr(backend.downloader, 'download_sentinel_timeseries', lambda lat, lng, dates, window_days=3: [
+        {'status': 'success', 'red_band': 0.1, 'nir_band': 0.3},
+        None,
+        {'status': 'success', 'red_band': 0.0, 'nir_band': 0.0},  # zero denominator
+    ])
+    resp = client.post('/api/ndvi/timeseries', json={
+        'latitude': 30.3398, 'longitude': 76.3869, 'start_date': '2024-05-01', 'end_date': '2024-05-15'
+    })
+    assert resp.status_code == 200
+    series = resp.get_json()['data']
+    assert [p['source'] for p in series] == ['copernicus_real', 'synthetic', 'synthetic']
+    assert series[0]['ndvi'] == pytest.approx(0.5)
+    assert series[1]['ndvi'] == series[2]['ndvi']
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {'latitude': 30.3, 'longitude': 76.3, 'start_date': '2024-05-01'},
+    {'latitude': 100, 'longitude': 76.3, 'start_date': '2024-05-01', 'end_date': '2024-05-15'},
+    {'latitude': 30.3, 'longitude': 76.3, 'start_date': '01/05/2024', 'end_date': '2024-05-15'},
+])
+def test_timeseries_invalid_inputs(client, payload):
+    assert client.post('/api/ndvi/timeseries', json=payload).status_code == 400
+
+
+# ==================== Visualization ====================
+
+def test_visualization_cache(client, backend):
+    resp = client.get('/api/ndvi/visualization/30.3398/76.3869')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'image/png'
+    assert resp.data.startswith(b'\x89PNG')
+    assert len(os.listdir(backend.VIZ_CACHE_DIR)) == 1
+
+    cached = client.get('/api/ndvi/visualization/30.3398/76.3869')
+    assert cached.status_code == 200
+    assert cached.get_data() == resp.data
+    assert client.get('/api/ndvi/visualization/30.3398/76.3869',
+                      headers={'If-None-Match': cached.headers['ETag']}).status_code == 304
+
+    # Another location with the same sample pattern is served from the same file
+    assert sample_pattern_key(30.4, 76.4) == sample_pattern_key(30.3398, 76.3869)
+    assert client.get('/api/ndvi/visualization/30.4/76.4').get_data() == resp.data
+    assert len(os.listdir(backend.VIZ_CACHE_DIR)) == 1
+
+
+@pytest.mark.parametrize("lat, lng", [('nan', 'inf'), ('91', '0'), ('north', '76.3')])
+def test_visualization_invalid_coordinates(client, backend, lat, lng):
+    assert client.get(f'/api/ndvi/visualization/{lat}/{lng}').status_code == 400
+    assert os.listdir(backend.VIZ_CACHE_DIR) == []
+
+
+def test_visualization_timeout(client, backend, monkeypatch):
+    def timed_out(latitude, longitude):
+        raise FutureTimeoutError()
+
+    monkeypatch.setattr(backend, 'render_visualization', timed_out)
+    resp = client.get('/api/ndvi/visualization/30.3398/76.3869')
+    assert resp.status_code == 504
+    assert resp.get_json()['error']
+
+
+def test_broken_visualization_pool_is_replaced(backend, monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool('A child process terminated abruptly')
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    class WorkingPool(BrokenPool):
+        def submit(self, *args):
+            future = Future()
+            future.set_result(b'png')
+            return future
+
+    pools = iter([BrokenPool(), WorkingPool()])
+    monkeypatch.setattr(backend, 'get_viz_pool', lambda: next(pools))
+    assert backend.render_visualization(30.3398, 76.3869) == b'png'
@@ -130,6 +130,35 @@ class NDVIIntegration:
             self.downloader = None
             self.create_sample_ndvi_data = None
 
+        # Known-location responses are fully determined by the calculator's table: build them once
+        self._known_responses = self._build_known_responses()
+
+    def _build_known_responses(self):
+        """Precompute the verified_ground_truth response for every known NDVI location"""
+        known_locations = getattr(self.calculator, 'known_locations', None) or {}
+        responses = {}
+        for coord_key, known_data in known_locations.items():
+            responses[coord_key] = {
+                'ndvi_value': known_data['ndvi'],
+                'ndvi_data_source': 'verified_ground_truth',
+                'data_quality': 'high',
+                'is_real_data': True,
+                'location_name': known_data['name'],
+                'health_analysis': {
+                    'category': known_data['health_category'],
+                    'health_score': known_data['health_score'],
+                    'description': known_data['description'],
+                    'crop_stage': known_data.get('crop_stage', 'Unknown')
+                },
+                'processing_details': {
+                    'source': 'known_location_database',
+                    'confidence': 0.95,
+                    'red_band': known_data.get('red_band', 0),
+                    'nir_band': known_data.get('nir_band', 0)
+                }
+            }
+        return responses
+
     def get_ndvi_for_location(self, latitude: float, longitude: float, days_back: int = 30):
         """Get NDVI data for a specific location using existing NDVI module"""
         if not self.ndvi_module_available:
@@ -142,35 +171,21 @@ class NDVIIntegration:
             # First, check if we have known location data (matches NDVI module exactly)
             coord_key = f"{latitude},{longitude}"
 
-            # Use local references and guard them to satisfy static checks
-            calculator = self.calculator
-            downloader = self.downloader
-
             # Check for exact matches in known locations
-            if calculator and hasattr(calculator, 'known_locations') and coord_key in calculator.known_locations:
-                known_data = calculator.known_locations[coord_key]
-                logger.info(f"✅ Found exact match in NDVI module: {known_data['name']}")
-
+            known_response = self._known_responses.get(coord_key)
+            if known_response is not None:
+                logger.info(f"✅ Found exact match in NDVI module: {known_response['location_name']}")
+                # Copy the nested blocks so callers can't mutate the shared table
                 return {
-                    'ndvi_value': known_data['ndvi'],
-                    'ndvi_data_source': 'verified_ground_truth',
-                    'data_quality': 'high',
-                    'is_real_data': True,
-                    'location_name': known_data['name'],
-                    'health_analysis': {
-                        'category': known_data['health_category'],
-                        'health_score': known_data['health_score'],
-                        'description': known_data['description'],
-                        'crop_stage': known_data.get('crop_stage', 'Unknown')
-                    },
-                    'processing_details': {
-                        'source': 'known_location_database',
-                        'confidence': 0.95,
-                        'red_band': known_data.get('red_band', 0),
-                        'nir_band': known_data.get('nir_band', 0)
-                    }
+                    **known_response,
+                    'health_analysis': dict(known_response['health_analysis']),
+                    'processing_details': dict(known_response['processing_details'])
                 }
 
+            # Use local references and guard them to satisfy static checks
+            calculator = self.calculator
+            downloader = self.downloader
+
             # Try to get real satellite data if no known location. If downloader exists but
             # network access is disabled (NDVI_FORCE_SIMULATED) or fails, prefer realistic
             # synthetic generation from the calculator's helper so unknown locations still
@@ -193,7 +208,8 @@ class NDVIIntegration:
                 # If we have downloaded band paths and a calculator, compute NDVI
                 if download_result and isinstance(download_result, dict) and download_result.get('red_band_path') and download_result.get('nir_band_path') and calculator:
                     try:
-                        ndvi_result = calculator.calculate_ndvi_from_files(download_result['red_band_path'], download_result['nir_band_path'])
+                        # Only the mean is used below, so known locations can skip the array
+                        ndvi_result = calculator.calculate_ndvi_from_files(download_result['red_band_path'], download_result['nir_band_path'], need_array=False)
                     except Exception as cex:
                         logger.warning(f"Calculator failed on downloaded bands: {cex}")
                         ndvi_result = None
@@ -309,21 +325,23 @@ class NDVIIntegration:
         """Fallback NDVI estimation when module is not available"""
         logger.info("🔄 Using fallback NDVI estimation")
 
-        # Enhanced geographic-based NDVI estimation
+        # Enhanced geographic-based NDVI estimation, seeded per coordinate so replays
+        # return the same estimate (and never touch the global NumPy RNG)
+        rng = np.random.default_rng(hash((round(float(latitude), 3), round(float(longitude), 3))) & 0xFFFFFFFF)
         base_ndvi = 0.4  # Default
 
         # Regional adjustments
         if 20 <= latitude <= 40:  # Temperate agricultural regions
             if 70 <= longitude <= 85:  # India
-                base_ndvi = np.random.uniform(0.45, 0.70)
+                base_ndvi = rng.uniform(0.45, 0.70)
             elif -100 <= longitude <= -60:  # North America  
-                base_ndvi = np.random.uniform(0.50, 0.75)
+                base_ndvi = rng.uniform(0.50, 0.75)
             else:
-                base_ndvi = np.random.uniform(0.35, 0.60)
+                base_ndvi = rng.uniform(0.35, 0.60)
         elif abs(latitude) < 20:  # Tropical
-            base_ndvi = np.random.uniform(0.40, 0.65)
+            base_ndvi = rng.uniform(0.40, 0.65)
         else:  # Other regions
-            base_ndvi = np.random.uniform(0.25, 0.50)
+            base_ndvi = rng.uniform(0.25, 0.50)
 
         return {
             'ndvi_value': round(base_ndvi, 4),